@@ -1,56 +1,14 @@
-import os
-import pandas
+from delimited import Delimited
 
 class CKMR():
-	'Class for outputting filtered pandas dataframe to CKMRsim (csv) format'
+	'Class for outputting filtered genotypes to CKMRsim (csv) format'
 
-	def __init__(self, df, cDat):
-		self.df = df
+	def __init__(self, geno, cDat):
+		self.geno = geno # Genotypes object with integer allele codes
 		self.cDat = cDat # colony data (potential male parent, female parent, offspring)
-		#self.ldict = ldict
 
-	def convert(self):
-		offspring = list() # list to contain offspring genotypes
-		parents = list() # list to contain parent genotypes
-
-		# handle header line
-		headerList = list()
-		headerList.append("indiv")
-		colNames = list(self.df.columns)
-		headerList.extend(colNames)
-		headerStr = "\t".join(headerList)
-
-		# add header line to each
-		offspring.append(headerStr)
-		parents.append(headerStr)
-
-		# handle offspring genotypes
-		for (sampleName, row) in self.df.iterrows():
-			if self.cDat[sampleName].casefold() == "offspring".casefold():
-				sampleStr = self.parseInd(sampleName, row)
-				offspring.append(sampleStr)
-			else:
-				sampleStr = self.parseInd(sampleName, row)
-				parents.append(sampleStr)
-		
-		# combine offspring and parents lists into output list
-		output = offspring + parents 
-
-		return output
-
-	def parseInd(self, sampleName, row):
-		sampleList = list()
-		locusList = list()
-		sampleList.append(str(sampleName))
-
-		for (locus, genotype) in row.items():
-			if not pandas.isnull(genotype):
-				locusList.append(str(genotype))
-			else:
-				locusList.append("NA")
-
-		locusStr = "\t".join(locusList)
-		sampleList.append(locusStr)
-		sampleStr = "\t".join(sampleList)
-
-		return sampleStr
+	def convert(self, outOffspring, outParents):
+		# offspring and parent genotypes go to separate tab-delimited files with "NA" for missing data
+		offspring = (self.cDat.reindex(self.geno.inds).str.casefold() == "offspring").to_numpy(dtype=bool)
+		writer = Delimited(self.geno, "\t")
+		writer.split(outOffspring, outParents, offspring)
@@ -1,19 +1,19 @@
 from decimal import Decimal, ROUND_HALF_EVEN
+from delimited import lookupBlocks
 
+import numpy
 import os
-import pandas
 import random
 
 class Colony():
-	'Class for converting pandas dataframe to colony format'
+	'Class for converting encoded genotypes to colony format'
 
-	def __init__(self, df, ldict, cDat, derr, gerr, pm, pf, runname, inbreed, runlen, colErr):
-		self.df = df
+	def __init__(self, geno, ldict, cDat, derr, gerr, pm, pf, runname, inbreed, runlen, colErr):
+		self.geno = geno # Genotypes object with integer allele codes
 		self.ldict = ldict
 
-		# make sure counts are accurate by removing filtered individuals from df
-		common_records = pandas.merge(self.df, cDat, on='indiv', how='inner')
-		self.cDat = common_records.pop('colony2') # colony data (potential male parent, female parent, offspring)
+		# make sure counts are accurate by removing filtered individuals
+		self.cDat = cDat[cDat.index.isin(self.geno.inds)] # colony data (potential male parent, female parent, offspring)
 
 		self.derr = derr # allelic dropout rate
 		self.gerr = gerr # genotyping error rate
@@ -29,66 +29,67 @@ class Colony():
 			self.parseColErr()
 
 	def convert(self):
-		output = list()
-
+		# returns a generator of output lines; the header and all validation are done before the output file is opened
 		randseed = random.randint(1000, 9999) # 4-digit random number seed
 		colonyCounts = self.cDat.str.lower().value_counts().to_dict() # counts of offspring and parents
 
-		loci = nLoci = int(len(self.df.columns)/2) # number of loci in dataframe
+		loci = nLoci = len(self.geno.loci) # number of loci
+
+		header = list() # lines before the offspring genotypes
 
 		datasetnamelist = list()
 		datasetnamelist.append("'")
 		datasetnamelist.append(str(self.runname))
 		datasetnamelist.append("'")
 		datasetline = "".join(datasetnamelist)
-		output.append(datasetline)
-		output.append(datasetline)
+		header.append(datasetline)
+		header.append(datasetline)
 
 		offspringline = str(colonyCounts["offspring"]) + "      ! Number of offspring in the sample"
-		output.append(offspringline)
+		header.append(offspringline)
 
 		lociline = str(loci) + "       ! Number of loci"
-		output.append(lociline)
+		header.append(lociline)
 
 		randseedline = str(randseed) + "      ! Seed for random number generator"
-		output.append(randseedline)
+		header.append(randseedline)
 
-		output.append("0         ! 0/1=Not updating/updating allele frequency")
-		output.append("2         ! 2/1=Dioecious/Monoecious species")
+		header.append("0         ! 0/1=Not updating/updating allele frequency")
+		header.append("2         ! 2/1=Dioecious/Monoecious species")
 
 		inbreedline = str(self.inbreed) + "         ! 0/1=Inbreeding absent/present"
-		output.append(inbreedline)
+		header.append(inbreedline)
 
-		output.append("0         ! 0/1=Diploid species/HaploDiploid species")
-		output.append("0  0      ! 0/1=Polygamy/Monogamy for males & females")
-		output.append("0         ! 0/1 = Clone inference = No/Yes")
-		output.append("1         ! 0/1=Scale full sibship=No/Yes")
-		output.append("0         ! 0/1/2/3/4=No/Weak/Medium/Strong sibship prior; 4=Optimal sibship prior for Ne")
-		output.append("0         ! 0/1=Unknown/Known population allele frequency")
-		output.append("1         ! Number of runs")
+		header.append("0         ! 0/1=Diploid species/HaploDiploid species")
+		header.append("0  0      ! 0/1=Polygamy/Monogamy for males & females")
+		header.append("0         ! 0/1 = Clone inference = No/Yes")
+		header.append("1         ! 0/1=Scale full sibship=No/Yes")
+		header.append("0         ! 0/1/2/3/4=No/Weak/Medium/Strong sibship prior; 4=Optimal sibship prior for Ne")
+		header.append("0         ! 0/1=Unknown/Known population allele frequency")
+		header.append("1         ! Number of runs")
 
 		runlenline = str(self.runlen) + "         ! 1/2/3/4 = Short/Medium/Long/VeryLong run"
-		output.append(runlenline)
+		header.append(runlenline)
 		
-		output.append("1         ! 0/1=Monitor method by Iterate#/Time in second")
-		output.append("1         ! Monitor interval in Iterate# / in seconds")
-		output.append("0         ! 0/1=DOS/Windows version")
-		output.append("1         ! 0/1/2=Pair-Likelihood-Score(PLS)/Full-Likelihood(FL)/FL-PLS-combined(FPLS) method")
-		output.append("2         ! 0/1/2/3=Low/Medium/High/VeryHigh precision")
-		output.append("")
+		header.append("1         ! 0/1=Monitor method by Iterate#/Time in second")
+		header.append("1         ! Monitor interval in Iterate# / in seconds")
+		header.append("0         ! 0/1=DOS/Windows version")
+		header.append("1         ! 0/1/2=Pair-Likelihood-Score(PLS)/Full-Likelihood(FL)/FL-PLS-combined(FPLS) method")
+		header.append("2         ! 0/1/2/3=Low/Medium/High/VeryHigh precision")
+		header.append("")
 
 		# print string of locus names
 		locusNames = self.getLocusNames()
 		locusString = " ".join(locusNames)
-		output.append(locusString)
+		header.append(locusString)
 
 		# print string of marker types. 0 = codominant, 1 = dominant
 		mtString = self.prepValues(loci, 0)
-		output.append(mtString)
+		header.append(mtString)
 
 		# print string of allelic dropout rates
 		adrString = self.prepValues(loci, self.derr)
-		output.append(adrString)
+		header.append(adrString)
 
 		# print string of genotyping error rates
 		if not self.errDict:
@@ -99,31 +100,11 @@ class Colony():
 				val = Decimal(str(self.errDict[l])).quantize(Decimal('0.0001'), rounding=ROUND_HALF_EVEN)
 				errList.append(str(val))
 			gerString = " ".join(errList)
-		output.append(gerString)
-
-		
-		for (sampleName, row) in self.df.iterrows():
-			if self.cDat[sampleName].casefold() == "offspring".casefold():
-				# if popmap value = offspring
-				sampleList = list()
-				locusList = list()
-				sampleList.append(str(sampleName))
-				for (locus, genotype) in row.items():
-					loc = locus[:-2]
-					if not pandas.isnull(genotype):
-						locusList.append(str(self.ldict[loc][genotype]))
-					else:
-						locusList.append("0")
-				locusStr = " ".join(locusList)
-				sampleList.append(locusStr)
-				sampleStr = " ".join(sampleList)
-				output.append(sampleStr)
-
-		output.append("")
+		header.append(gerString)
 
 		# set probabilities that male and/or female parent included among candidates
 		if ("male" not in colonyCounts) and ("female" not in colonyCounts):
-			output.append("0.0  0.0     !prob. of dad/mum included in the candidates")
+			probString = "0.0  0.0     !prob. of dad/mum included in the candidates"
 		else:
 			templine = list() # list to build probabilities line
 			if "male" in colonyCounts:
@@ -137,13 +118,11 @@ class Colony():
 				templine.append("0.0")
 
 			templine.append("      !prob. of dad/mum included in the candidates")
-			mfCountString = " ".join(templine)
-
-			output.append(mfCountString)
+			probString = " ".join(templine)
 	
 		# set number of male and/or female parents
 		if ("male" not in colonyCounts) and ("female" not in colonyCounts):
-			output.append("0  0         !numbers of candidate males & females")
+			mfCountString = "0  0         !numbers of candidate males & females"
 		else:
 			templine = list() # list to build line from
 			if "male" in colonyCounts:
@@ -159,65 +138,61 @@ class Colony():
 			templine.append("      !numbers of candidate males & females")
 			mfCountString = " ".join(templine)
 
-			output.append(mfCountString)
+		roles = self.cDat.reindex(self.geno.inds).str.casefold().to_numpy(dtype=object) # colony2 role of each individual
+
+		return self.lines(header, roles, colonyCounts, probString, mfCountString)
 
-		output.append("")
+	def lines(self, header, roles, colonyCounts, probString, mfCountString):
+		yield from header
+		
+		# genotypes are rendered in blocks of individuals as they are written
+		yield from self.renderGenotypes(roles == "offspring")
+
+		yield ""
+		yield probString
+		yield mfCountString
+
+		yield ""
 		# genotypes of male parent candidates go here
 		if "male" in colonyCounts:
-			for (sampleName, row) in self.df.iterrows():
-				if self.cDat[sampleName].casefold() == "male".casefold():
-					sampleList = list()
-					locusList = list()
-					sampleList.append(str(sampleName))
-					for (locus, genotype) in row.items():
-						loc = locus[:-2]
-						if not pandas.isnull(genotype):
-							locusList.append(str(self.ldict[loc][genotype]))
-						else:
-							locusList.append("0")
-					locusStr = " ".join(locusList)
-					sampleList.append(locusStr)
-					sampleStr = " ".join(sampleList)
-					output.append(sampleStr)
-
-		output.append("")
+			yield from self.renderGenotypes(roles == "male")
+
+		yield ""
 		# genotypes of female parent candidates go here
 		if "female" in colonyCounts:
-			for (sampleName, row) in self.df.iterrows():
-				if self.cDat[sampleName].casefold() == "female".casefold():
-					sampleList = list()
-					locusList = list()
-					sampleList.append(str(sampleName))
-					for (locus, genotype) in row.items():
-						loc = locus[:-2]
-						if not pandas.isnull(genotype):
-							locusList.append(str(self.ldict[loc][genotype]))
-						else:
-							locusList.append("0")
-					locusStr = " ".join(locusList)
-					sampleList.append(locusStr)
-					sampleStr = " ".join(sampleList)
-					output.append(sampleStr)
-
-		output.append("")
-		output.append("0  0        !#known father-offspring dyads, paternity exclusion threshold")
-		output.append("")
-		output.append("0  0        !#known mother-offspring dyads, maternity exclusion threshold")
-		output.append("")
-		output.append("0           !#known paternal sibship with unknown fathers")
-		output.append("")
-		output.append("0           !#known maternal sibship with unknown mothers")
-		output.append("")
-		output.append("0           !#known paternity exclusions")
-		output.append("")
-		output.append("0           !#known maternity exclusions")
-		output.append("")
-		output.append("0           !#known paternal sibship exclusions")
-		output.append("")
-		output.append("0           !#known maternal sibship exclusions")
-		output.append("")
-
-		return output
+			yield from self.renderGenotypes(roles == "female")
+
+		yield ""
+		yield "0  0        !#known father-offspring dyads, paternity exclusion threshold"
+		yield ""
+		yield "0  0        !#known mother-offspring dyads, maternity exclusion threshold"
+		yield ""
+		yield "0           !#known paternal sibship with unknown fathers"
+		yield ""
+		yield "0           !#known maternal sibship with unknown mothers"
+		yield ""
+		yield "0           !#known paternity exclusions"
+		yield ""
+		yield "0           !#known maternity exclusions"
+		yield ""
+		yield "0           !#known paternal sibship exclusions"
+		yield ""
+		yield "0           !#known maternal sibship exclusions"
+		yield ""
+
+
+	def renderGenotypes(self, mask):
+		# translate the integer allele codes of each locus into locus dictionary codes ("0" = missing data)
+		# and yield one line per individual selected by mask
+		tables = list()
+		for locus, alleles in zip(self.geno.loci, self.geno.alleles):
+			# alleles that were not observed when the locus dictionary was made are never selected by a code
+			table = numpy.array([str(self.ldict[locus].get(allele)) for allele in alleles] + ["0"], dtype=object) # code -1 selects missing data
+			tables.extend([table, table]) # same table for both allele columns
+		codes = self.geno.codes.reshape(len(self.geno.inds), -1) # allele columns in input (_1, _2) order
+		for positions, names, cells in lookupBlocks(self.geno.inds, codes, tables, numpy.flatnonzero(mask)):
+			for sampleName, row in zip(names, cells.tolist()):
+				yield str(sampleName) + " " + " ".join(row)
 
 	def parseColErr(self):
 		print("Using user-specified error rates from", str(self.colErr))
@@ -234,12 +209,7 @@ class Colony():
 
 
 	def getLocusNames(self):
-		colNames = list(self.df.columns) #get column names from pandas dataframe
-		dupLoci = [item[:-2] for item in colNames] #strip allele identifiers from ends
-
-		singleLoci = dupLoci[1::2] #keep odd numbered list elements
-
-		return singleLoci
+		return list(self.geno.loci) # locus names without allele identifiers
 
 	def prepValues(self, nloci, val):
 		valList = [str(val)] * nloci
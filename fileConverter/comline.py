@@ -9,6 +9,7 @@ class ComLine():
 		parser = argparse.ArgumentParser()
 		parser._action_groups.pop()
 		required = parser.add_argument_group('required arguments')
+		inputs = parser.add_argument_group('input arguments')
 		filtering = parser.add_argument_group('filtering arguments')
 		colony = parser.add_argument_group('colony arguments')
 		snppit = parser.add_argument_group('snppit arguments')
@@ -21,8 +22,23 @@ class ComLine():
 		)
 		required.add_argument("-r", "--runname",
 							dest='runname',
-							required=True,
-							help="Provide a unique name for the Colony run. Output files from Colony will receive this name (required)."
+							help="Provide a unique name for the Colony run. Output files from Colony will receive this name (required unless -W is used)."
+		)
+		inputs.add_argument("-x", "--cache",
+							dest='cache',
+							action='store_true',
+							help="Cache the parsed input file in binary format next to the input file and reuse it on later runs. The cache is rebuilt automatically when the input file changes (default = False)."
+		)
+		inputs.add_argument("-y", "--compact",
+							dest='compact',
+							action='store_true',
+							help="Read allele columns in compact (categorical) format to reduce memory use on large files (default = False)."
+		)
+		inputs.add_argument("-S", "--stream",
+							dest='stream',
+							type=int,
+							default=0,
+							help="Read the input file in chunks of this many rows and drop individuals that fail the missing data filter (-i) while reading. Use for input files that are too large to fit in memory (default = 0; read the whole file at once)."
 		)
 		filtering.add_argument("-D", "--dups",
 							dest='dups',
@@ -33,8 +49,8 @@ class ComLine():
 							dest='keepdups',
 							type=str,
 							default='none',
-							choices={'all','first','second','none'},
-							help="Methods for keeping duplicates. 'all' = keep all duplicates; 'first' = keep first encountered; 'second' = keep second; 'none' = keep none (default)"
+							choices={'all','best','first','second','none'},
+							help="Methods for keeping duplicates. Duplicate pairs are grouped into clusters and the method is applied to each cluster. 'all' = keep all duplicates; 'best' = keep the sample with the least missing data; 'first' = keep first encountered; 'second' = keep last encountered; 'none' = keep none (default)"
 		)
 		filtering.add_argument("-T", "--dupthresh",
 							dest='dupthresh',
@@ -42,6 +58,22 @@ class ComLine():
 							default=3,
 							help="Maximum number of allelic mismatches for identifying duplicate individuals (default = 3)."
 		)
+		filtering.add_argument("-j", "--threads",
+							dest='threads',
+							type=int,
+							default=1,
+							help="Number of processes used to compare all pairs of individuals when detecting duplicates (default = 1)."
+		)
+		filtering.add_argument("-B", "--bands",
+							dest='bands',
+							type=int,
+							default=0,
+							help="Only compare pairs of individuals that match exactly at one or more of this many random subsets of loci when detecting duplicates. Missing calls are treated as wildcards: pairs that cannot be ruled out because of missing data are compared exactly, so no duplicates are missed. Use more than -T + 1 subsets for the index to prune pairs (default = 0; compare all pairs)."
+		)
+		filtering.add_argument("-X", "--refindex",
+							dest='refindex',
+							help="Specify a reference index file (.npz) of genotypes from previously processed runs. Samples are checked for duplicates against the index and then added to it. The file is created if it does not exist. Requires -D."
+		)
 		filtering.add_argument("-i", "--pmissind",
 							dest='pmissind',
 							type=float,
@@ -54,6 +86,36 @@ class ComLine():
 							default=0.3,
 							help="Enter the maximum allowable proportion of missing data for a locus (default = 0.3)."
 		)
+		filtering.add_argument("-P", "--pmisslocpop",
+							dest='pmisslocpop',
+							type=float,
+							help="Enter the maximum allowable proportion of missing data for a locus within any single population. Loci that exceed it in at least one population are removed everywhere (default = not used)."
+		)
+		filtering.add_argument("-O", "--monopop",
+							dest='monopop',
+							action='store_true',
+							help="Remove loci that are monomorphic within every population for the same allele in all populations. Loci fixed for different alleles in different populations are kept (default = False)."
+		)
+		filtering.add_argument("-A", "--converge",
+							dest='converge',
+							action='store_true',
+							help="Repeat the individual (-i) and locus (-l) missing data filters until no more individuals or loci are removed. The number of rounds and removals per round are written to the log file (default = False; run each filter once)."
+		)
+		filtering.add_argument("-W", "--sweep",
+							dest='sweep',
+							action='store_true',
+							help="Threshold sweep mode. Report how many individuals and loci (total and per population) pass the missing data filters for every combination of the --sweepind and --sweeploc values, then exit without filtering or writing converted files (default = False)."
+		)
+		filtering.add_argument("--sweepind",
+							dest='sweepind',
+							default="0.05,0.1,0.15,0.2,0.25,0.3,0.35,0.4,0.45,0.5,0.55,0.6,0.65,0.7,0.75,0.8,0.85,0.9,0.95,1.0",
+							help="Comma-separated list of maximum proportions of missing data per individual for -W (default = 0.05 to 1.0 in steps of 0.05)."
+		)
+		filtering.add_argument("--sweeploc",
+							dest='sweeploc',
+							default="0.05,0.1,0.15,0.2,0.25,0.3,0.35,0.4,0.45,0.5,0.55,0.6,0.65,0.7,0.75,0.8,0.85,0.9,0.95,1.0",
+							help="Comma-separated list of maximum proportions of missing data per locus for -W (default = 0.05 to 1.0 in steps of 0.05)."
+		)
 		filtering.add_argument("-m", "--mono",
 							dest='mono',
 							action='store_false',
@@ -139,6 +201,21 @@ class ComLine():
 							action='store_true',
 							help="Write SNPPIT format file."
 		)
+		conversion.add_argument("-H", "--plots",
+							dest='plots',
+							action='store_true',
+							help="Write summary plots (histogram of alleles per locus) to the output directory. Requires matplotlib."
+		)
+		conversion.add_argument("-J", "--convthreads",
+							dest='convthreads',
+							type=int,
+							default=1,
+							help="Number of processes used to write the requested output formats at the same time (default = 1)."
+		)
+		conversion.add_argument("-K", "--snpcoords",
+							dest='snpcoords',
+							help="Specify a .json file of SNP positions per locus for the Sequoia and SNPPIT formats. If the file exists, its positions are used instead of selecting SNPs; otherwise the selected positions are written to it for later runs."
+		)
 		snppit.add_argument("-Z", "--snppitmap",
 							dest='snppitmap',
 							help="Provide a tab-delimited file specifying POP and OFFSPRING groups for SNPPIT format. Required if converting a SNPPIT file."
@@ -151,7 +228,7 @@ class ComLine():
 			raise SystemExit(1)
 		
 		if self.zeroOne(self.args.pfemale) is False:
-			print("ERROR: option -P must be between 0.0 and 1.0")
+			print("ERROR: option -F must be between 0.0 and 1.0")
 			raise SystemExit(1)
 
 		if self.zeroOne(self.args.droperr) is False:
@@ -170,8 +247,47 @@ class ComLine():
 			print("ERROR: option -l must be between 0.0 and 1.0")
 			raise SystemExit(1)
 
-		#check if at least one conversion option was used.
-		if not [x for x in (self.args.colony, self.args.csv, self.args.ckmr, self.args.sequoia, self.args.snppit) if x is True]:
+		if self.args.pmisslocpop is not None and self.zeroOne(self.args.pmisslocpop) is False:
+			print("ERROR: option -P must be between 0.0 and 1.0")
+			raise SystemExit(1)
+
+		if self.args.bands < 0:
+			print("ERROR: option -B must be 0 or greater")
+			raise SystemExit(1)
+
+		if self.args.refindex and not self.args.dups:
+			print("ERROR: option -X requires duplicate detection (-D)")
+			raise SystemExit(1)
+
+		if self.args.stream < 0:
+			print("ERROR: option -S must be 0 or greater")
+			raise SystemExit(1)
+
+		if self.args.stream and self.args.cache:
+			print("ERROR: options -S and -x cannot be used together")
+			raise SystemExit(1)
+
+		if self.args.threads < 1:
+			print("ERROR: option -j must be at least 1")
+			raise SystemExit(1)
+
+		if self.args.convthreads < 1:
+			print("ERROR: option -J must be at least 1")
+			raise SystemExit(1)
+
+		self.args.sweepind = self.parseGrid(self.args.sweepind, "--sweepind")
+		self.args.sweeploc = self.parseGrid(self.args.sweeploc, "--sweeploc")
+
+		if self.args.sweep and self.args.stream:
+			print("ERROR: options -W and -S cannot be used together")
+			raise SystemExit(1)
+
+		if not self.args.sweep and not self.args.runname:
+			print("ERROR: option -r is required")
+			raise SystemExit(1)
+
+		#check if at least one conversion option was used (not needed in threshold sweep mode).
+		if not self.args.sweep and not [x for x in (self.args.colony, self.args.csv, self.args.ckmr, self.args.sequoia, self.args.snppit) if x is True]:
 			print("")
 			print("No format conversion options were selected.")
 			print("You must choose at least one file format for output.")
@@ -198,6 +314,18 @@ class ComLine():
 	def zeroOne(self, num):
 		return 0.0 <= num <= 1.0
 
+	def parseGrid(self, values, option):
+		# convert comma-separated list of thresholds to floats between 0.0 and 1.0
+		try:
+			grid = [float(val) for val in values.split(",") if val.strip()]
+		except ValueError:
+			print("ERROR: option " + option + " must be a comma-separated list of numbers")
+			raise SystemExit(1)
+		if not grid or not all(self.zeroOne(val) for val in grid):
+			print("ERROR: values of option " + option + " must be between 0.0 and 1.0")
+			raise SystemExit(1)
+		return grid
+
 	def exists(self, filename):
 		if( os.path.isfile(filename) != True ):
 			print("")
@@ -0,0 +1,115 @@
+import hashlib
+import numpy
+import os
+import pandas
+
+class CSVCache():
+	'Class for caching a parsed input .csv file in binary columnar format'
+
+	version = 1 # increment when the layout of the cache file changes
+
+	def __init__(self, infile, compact):
+		self.infile = infile
+		self.mode = "compact" if compact else "default" # caches are only reused with the same ingestion mode
+		fn, ext = os.path.splitext(infile)
+		self.path = fn + ".cache.npz" # cache is stored next to the input file
+		self.digest = self.hashFile()
+
+	def hashFile(self):
+		# content hash of the input file; the cache is only used if the hash matches
+		sha = hashlib.sha256()
+		with open(self.infile, 'rb') as fh:
+			for chunk in iter(lambda: fh.read(1 << 20), b''):
+				sha.update(chunk)
+		return sha.hexdigest()
+
+	def load(self):
+		# returns the cached dataframe, or None if there is no valid cache for the input file
+		if not os.path.isfile(self.path):
+			return None
+
+		try:
+			with numpy.load(self.path) as data:
+				if str(data['hash']) != self.digest or int(data['version']) != self.version or str(data['mode']) != self.mode:
+					print("Cached copy of input file is out of date and will be replaced.")
+					return None
+
+				names = data['names'].tolist() # index name followed by column names
+				dtypes = data['dtypes'].tolist()
+				strCols = {col: j for j, col in enumerate(data['strCols'].tolist())} # column -> position in codes
+				codes = data['codes'] # one row of codes per string column
+				resolved = {name: pandas.api.types.pandas_dtype(name) for name in set(dtypes)} # look up each dtype once
+				strings = self.unpackStrings(data['table'], data['tableOffsets'], data['tableBreaks'])
+
+				columns = list()
+				for i in range(len(names)):
+					if i in strCols:
+						j = strCols[i]
+						uniq = numpy.array(strings[j] + [numpy.nan], dtype=object) # code -1 selects nan
+						columns.append(pandas.array(uniq[codes[j]], dtype=resolved[dtypes[i]]))
+					else:
+						columns.append(pandas.array(data['num_' + str(i)], dtype=resolved[dtypes[i]]))
+		except (OSError, KeyError, ValueError) as e:
+			print("Could not read cached copy of input file (" + str(e) + "). It will be replaced.")
+			return None
+
+		index = pandas.Index(columns[0], name=(names[0] or None))
+		df = pandas.DataFrame(dict(zip(names[1:], columns[1:])), index=index)
+		print("Read input from cached copy", self.path)
+
+		return df
+
+	def save(self, df):
+		# string columns are stored as integer codes plus a table of unique strings; numeric columns as-is
+		series = [df.index.to_series()] + [df[col] for col in df.columns] # index is stored as the first column
+		names = [df.index.name or ""] + [str(col) for col in df.columns]
+		dtypes = [str(ser.dtype) for ser in series]
+
+		strCols = list()
+		codeList = list()
+		tables = list()
+		arrays = dict()
+		for i, ser in enumerate(series):
+			if pandas.api.types.is_numeric_dtype(ser) or pandas.api.types.is_bool_dtype(ser):
+				arrays['num_' + str(i)] = ser.to_numpy()
+			else:
+				codes, uniq = pandas.factorize(ser.to_numpy(dtype=object))
+				strCols.append(i)
+				codeList.append(codes.astype(numpy.int32))
+				tables.append([str(u) for u in uniq])
+
+		table, offsets, breaks = self.packStrings(tables)
+		if codeList:
+			codes = numpy.stack(codeList, axis=0)
+		else:
+			codes = numpy.empty((0, len(df)), dtype=numpy.int32)
+
+		# write to a temporary file first so an interrupted run cannot leave a corrupt cache
+		tmp = self.path + ".tmp.npz"
+		numpy.savez(tmp,
+			hash=numpy.array(self.digest),
+			version=numpy.array(self.version),
+			mode=numpy.array(self.mode),
+			names=numpy.array(names, dtype=str),
+			dtypes=numpy.array(dtypes, dtype=str),
+			strCols=numpy.array(strCols, dtype=numpy.int64),
+			codes=codes,
+			table=table,
+			tableOffsets=offsets,
+			tableBreaks=breaks,
+			**arrays)
+		os.replace(tmp, self.path)
+		print("Wrote cached copy of input file to", self.path)
+
+	def packStrings(self, tables):
+		# store all string tables as one utf-8 byte array; offsets mark string ends, breaks mark table ends
+		encoded = [s.encode('utf-8') for table in tables for s in table]
+		table = numpy.frombuffer(b''.join(encoded), dtype=numpy.uint8)
+		offsets = numpy.cumsum([0] + [len(s) for s in encoded]).astype(numpy.int64)
+		breaks = numpy.cumsum([0] + [len(strings) for strings in tables]).astype(numpy.int64)
+		return table, offsets, breaks
+
+	def unpackStrings(self, table, offsets, breaks):
+		raw = table.tobytes()
+		strings = [raw[offsets[k]:offsets[k+1]].decode('utf-8') for k in range(len(offsets) - 1)]
+		return [strings[breaks[j]:breaks[j+1]] for j in range(len(breaks) - 1)]
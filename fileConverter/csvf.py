@@ -1,37 +1,12 @@
-import os
-import pandas
+from delimited import Delimited
 
 class CSVfiltered():
-	'Class for outputting filtered pandas dataframe to csv format'
+	'Class for outputting filtered genotypes to csv format'
 
-	def __init__(self, df):
-		self.df = df
-		#self.ldict = ldict
-		#self.cDat = cDat # colony data (potential male parent, female parent, offspring)
+	def __init__(self, geno):
+		self.geno = geno # Genotypes object with integer allele codes
 
-	def convert(self):
-		output = list()
-		# handle header line
-		headerList = list()
-		headerList.append("indiv")
-		colNames = list(self.df.columns)
-		headerList.extend(colNames)
-		headerStr = ",".join(headerList)
-		output.append(headerStr)
-
-		# handle genotypes
-		for (sampleName, row) in self.df.iterrows():
-			sampleList = list()
-			locusList = list()
-			sampleList.append(str(sampleName))
-			for (locus, genotype) in row.items():
-				if not pandas.isnull(genotype):
-					locusList.append(str(genotype))
-				else:
-					locusList.append("NA")
-			locusStr = ",".join(locusList)
-			sampleList.append(locusStr)
-			sampleStr = ",".join(sampleList)
-			output.append(sampleStr)
-
-		return output
+	def convert(self, outName):
+		# filtered genotypes with "NA" for missing data
+		writer = Delimited(self.geno, ",")
+		writer.write(outName)
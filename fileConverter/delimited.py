@@ -0,0 +1,55 @@
+import numpy
+
+def lookupBlocks(names, codes, tables, rows, block=1000):
+	# yields (positions, sample names, cells) for blocks of the given rows of an integer code matrix
+	# (-1 = missing data); tables[j] holds the string of every code of column j followed by the missing data string
+	for start in range(0, len(rows), block):
+		positions = rows[start:start+block]
+		part = codes[positions]
+		cells = numpy.empty(part.shape, dtype=object)
+		for j, table in enumerate(tables):
+			cells[:, j] = table[part[:, j]]
+		yield positions, names[positions], cells
+
+class Delimited():
+	'Class for writing encoded genotypes as delimited text'
+
+	def __init__(self, geno, sep, na="NA"):
+		self.geno = geno # Genotypes object with integer allele codes
+		self.sep = sep # field separator
+		self.na = na # value written for missing data
+
+	def header(self):
+		return self.sep.join(["indiv"] + self.geno.columns())
+
+	def blocks(self):
+		# yields row positions and one line per individual for a block of individuals at a time
+		tables = list()
+		for alleles in self.geno.alleles:
+			table = numpy.array([str(allele) for allele in alleles] + [self.na], dtype=object) # code -1 selects missing data
+			tables.extend([table, table]) # same table for both allele columns
+		codes = self.geno.codes.reshape(len(self.geno.inds), -1) # allele columns in input (_1, _2) order
+		for positions, names, cells in lookupBlocks(self.geno.inds, codes, tables, numpy.arange(len(self.geno.inds))):
+			yield positions, [str(sampleName) + self.sep + self.sep.join(row) + "\n" for sampleName, row in zip(names, cells.tolist())]
+
+	def write(self, outName):
+		print("Writing to", outName)
+		print("")
+		with open(outName, 'w') as fh:
+			fh.write(self.header() + "\n")
+			for positions, lines in self.blocks():
+				fh.write(''.join(lines))
+
+	def split(self, first, second, mask):
+		# write rows where mask is True to the first file and all other rows to the second, each with a header,
+		# in one pass over blocks of individuals
+		print("Writing to", first, "and", second)
+		print("")
+		header = self.header() + "\n"
+		with open(first, 'w') as fh1, open(second, 'w') as fh2:
+			fh1.write(header)
+			fh2.write(header)
+			for positions, lines in self.blocks():
+				isFirst = mask[positions]
+				fh1.write(''.join([line for line, f in zip(lines, isFirst) if f]))
+				fh2.write(''.join([line for line, f in zip(lines, isFirst) if not f]))
@@ -1,17 +1,23 @@
-import numpy
-import pandas
-
-from itertools import combinations
+from lshindex import LSHIndex
+from mismatch import Mismatch
+from refindex import RefIndex
+from unionfind import UnionFind
 
 class Duplicates():
-	'Class for finding duplicates in pandas dataframe'
+	'Class for finding duplicate individuals among encoded genotypes'
 
-	def __init__(self, df, t, k, l):
-		self.npArr = df.to_numpy() # convert pandas df to numpy array
-		self.origIndex = df.index.to_numpy() # retain original indexes to lookup matching samples
+	def __init__(self, geno, t, k, l, threads, bands, refIndex, source):
+		self.geno = geno # Genotypes object; canonical allele codes make comparisons independent of allele order
+		self.origIndex = geno.inds.to_numpy() # retain original indexes to lookup matching samples
 		self.thresh = t # threshold for mismatches
 		self.keep = k # method for keeping duplicates
 		self.log = l # log file
+		self.threads = threads # number of processes used for pairwise comparisons
+		self.bands = bands # number of locus subsets for the candidate pair index; 0 = compare all pairs
+		self.refIndex = refIndex # path to persistent index of genotypes from earlier runs (optional)
+		self.source = source # input file name recorded for samples added to the reference index
+		self.ref = None # RefIndex object
+		self.refCodes = None # genotypes of this run encoded with the reference index allele codes
 
 		# lists of duplicates
 		self.first = list()
@@ -19,19 +25,23 @@ class Duplicates():
 
 	def findDups(self):
 		print(f"\nChecking for duplicate samples allowing for {self.thresh} mismatches.")
-		print("I need to improve this function. It only works if alleles are sorted alphabetically per locus.")
 		print("This can take a while with large files...\n")
-		# find all unique pairs of indices
-		rowPairs = list(combinations(range(len(self.npArr)), 2))
+		# count mismatches for all unique pairs of rows in blocks; nan values are never counted as mismatches
+		engine = Mismatch(self.geno.canonical())
+		if self.bands > 0:
+			# only count mismatches for candidate pairs that share a bucket in the index
+			index = LSHIndex(engine.codes, self.bands)
+			firstIdx, secondIdx, counts = index.findPairs(engine, self.thresh)
+			index.report(self.thresh, self.log)
+		else:
+			firstIdx, secondIdx, counts = engine.findPairs(self.thresh, self.threads)
 
-		# calculate mismatches for each pair and store result with indices
+		# store pairs with <= self.thresh mismatches
 		results = []
-		for i, j in rowPairs:
-			mismatches = numpy.sum((self.npArr[i] != self.npArr[j]) & (self.npArr[i] == self.npArr[i]) & (self.npArr[j] == self.npArr[j])) # works to exclude nan values because expression 'a == a' evaluates to 'false' if a is nan
-			if mismatches <= self.thresh:
-				self.first.append(self.origIndex[i])
-				self.second.append(self.origIndex[j])
-				results.append((self.origIndex[i], self.origIndex[j], str(int(mismatches))))
+		for i, j, mismatches in zip(firstIdx, secondIdx, counts):
+			self.first.append(self.origIndex[i])
+			self.second.append(self.origIndex[j])
+			results.append((self.origIndex[i], self.origIndex[j], str(int(mismatches))))
 
 		# Print the pairs with up to self.thresh mismatches
 		print("These were detected as possible duplicates:") #stdout
@@ -44,26 +54,103 @@ class Duplicates():
 				print(newString)
 				fh.write(newString)
 				fh.write("\n")
-		
+
+		if self.refIndex:
+			self.findRefDups()
+
+	def findRefDups(self):
+		# compare samples from this run against samples from earlier runs stored in the reference index
+		print(f"\nChecking for duplicates of previously processed samples in {self.refIndex}.")
+		self.ref = RefIndex(self.refIndex, self.source)
+		self.refCodes = self.ref.encode(self.geno)
+		pairs = self.ref.findPairs(self.refCodes, self.origIndex, self.thresh)
+
+		print("These were detected as possible duplicates of samples in the reference index:") #stdout
+		print("Reference_Sample\tReference_Run\tSample\tMismatches") #stdout
+		with open(self.log, 'a') as fh:
+			fh.write("\nThese were detected as possible duplicates of samples in the reference index:\n") #log file
+			fh.write("Reference_Sample\tReference_Run\tSample\tMismatches\n") #log file
+			for (refSample, refRun, i, mismatches) in pairs:
+				# reference samples were encountered first
+				self.first.append(refSample)
+				self.second.append(self.origIndex[i])
+				newString = '\t'.join([refSample, refRun, self.origIndex[i], str(mismatches)])
+				print(newString)
+				fh.write(newString)
+				fh.write("\n")
+
+	def updateIndex(self, removeList):
+		# add samples from this run that were not removed as duplicates to the reference index
+		if self.ref is None:
+			return
+		removed = set(removeList)
+		keep = [i for i, sample in enumerate(self.origIndex) if sample not in removed]
+		self.ref.append(self.refCodes[keep], self.origIndex[keep])
+
+	def clusterDups(self):
+		# group duplicate pairs into clusters with union-find; each cluster holds all copies of one individual
+		uf = UnionFind()
+		for sample1, sample2 in zip(self.first, self.second):
+			uf.union(sample1, sample2)
+		return uf.groups()
+
 	def removeDups(self):
-		removeList = list()
 		if self.keep == "all":
 			print("\nIf duplicates were detected, then all were retained.")
 		elif self.keep == "first":
-			print("\nFirst duplicate retained.")
-			removeList = list(dict.fromkeys(self.second)) # remove second duplicate
+			print("\nFirst encountered duplicate in each cluster retained.")
 		elif self.keep == "second":
-			print("\nSecond duplicate retained.")
-			removeList = list(dict.fromkeys(self.first)) # remove first duplicate
+			print("\nLast encountered duplicate in each cluster retained.")
+		elif self.keep == "best":
+			print("\nDuplicate with the least missing data in each cluster retained.")
 		elif self.keep == "none":
 			print("\nNo duplicates retained.")
-			allList = self.first + self.second # combine lists of first and second duplicates
-			allList = sorted(allList) # sort list
-			removeList = list(dict.fromkeys(allList)) # remove all duplicates
 		else:
 			print("This code should be unreachable.")
 			print("No method for removing duplicates - how did you get here?")
 
+		clusters = self.clusterDups()
+
+		position = {sample: i for i, sample in enumerate(self.origIndex)} # row of each sample in this run
+		missing = (self.geno.codes < 0).sum(axis=(1, 2)) # missing alleles per individual
+
+		removeList = list()
+		clusterLines = list()
+		for num, members in enumerate(clusters, start=1):
+			# samples from the reference index were encountered before any sample from this run
+			members = sorted(members, key=lambda sample: position.get(sample, -1))
+			present = [sample for sample in members if sample in position]
+
+			kept = set()
+			if self.keep == "all":
+				kept = set(members)
+			elif self.keep == "first":
+				kept = {members[0]}
+			elif self.keep == "second":
+				kept = {members[-1]}
+			elif self.keep == "best" and present:
+				kept = {min(present, key=lambda sample: missing[position[sample]])} # ties go to the first encountered
+
+			for sample in members:
+				if sample not in position:
+					# samples from the reference index belong to earlier runs and cannot be removed from this run
+					clusterLines.append([str(num), sample, "NA", "reference"])
+				elif sample in kept:
+					clusterLines.append([str(num), sample, str(missing[position[sample]]), "kept"])
+				else:
+					clusterLines.append([str(num), sample, str(missing[position[sample]]), "removed"])
+					removeList.append(sample)
+
+		removeList = sorted(removeList)
+
+		print(f"{len(clusters)} clusters of duplicate samples were detected (see log for details).")
+		with open(self.log, 'a') as fh:
+			fh.write("\nDuplicate sample clusters:\n") #log file
+			fh.write("Cluster\tSample\tMissing_Alleles\tStatus\n") #log file
+			for line in clusterLines:
+				fh.write('\t'.join(line))
+				fh.write("\n")
+
 		if removeList:
 			print("The following samples are removed as duplicates:") #stdout
 			with open(self.log, 'a') as fh:
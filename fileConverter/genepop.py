@@ -1,68 +1,60 @@
+from delimited import lookupBlocks
 from popmap import Popmap
 
+import numpy
 import os
-import pandas
 
 class Genepop():
-	'Class for converting pandas dataframe to Genepop format'
+	'Class for converting encoded genotypes to Genepop format'
 
-	def __init__(self, df, popmap, convDir, ldict):
-		self.df = df
+	def __init__(self, geno, popmap, convDir, ldict):
+		self.geno = geno # Genotypes object with integer allele codes
 		self.pops = popmap
 		self.convertedDir = convDir
 		self.ldict = ldict
 
 	def convert(self):
+		# returns a generator of output lines; the population map is written before any genotypes are rendered
 		pm = Popmap(self.pops)
 		mapDict = pm.parseMap()
+		pops = pm.pops # population names normalized by parseMap
 		mapDict = dict(sorted(mapDict.items())) # sort dict
 
-		# open file for writing population map
-		popmapOut = os.path.join(self.convertedDir, "genepopmap.txt")
-		fh = open(popmapOut, 'w')
-
-		lineList = list()
-
-		lineList.append('Title line:""')
-
-		self.df.columns = self.df.columns.str.slice(stop=-2)
-		uniq = pandas.unique(pandas.Series(self.df.columns.tolist())).tolist() # get unique column names
-		for columnName in uniq:
-			lineList.append(columnName)
-
-		for (pop, num) in mapDict.items():
-			lineList.append("Pop")
-			for sampleName, row in self.df.iterrows():
-				sampleList = list()
-				if self.pops[sampleName] == pop:
-					# write to popmap
-					fh.write(sampleName)
-					fh.write("\t")
-					fh.write(pop)
-					fh.write("\n")
+		# group individuals by population once, keeping input order within each population
+		groups = dict()
+		for i, sampleName in enumerate(self.geno.inds):
+			groups.setdefault(pops[sampleName], list()).append(i)
 
-					# append data to sampleList
-					sampleList.append(sampleName)
-					sampleList.append(",")
-					sampleList.append("")
-					counter=0 # counter to determine when to add spaces
-					locusList = list()
-					for (locus, genotype) in row.items():
-						if pandas.isna(genotype) == True:
-							locusList.append("000")
-						else:
-							locusList.append(self.ldict[locus][genotype])
-
-						counter+=1 # increment counter
-						# on even numbers
-						if counter % 2 == 0:
-							locusStr = ''.join(locusList) # make string for locus
-							sampleList.append(locusStr) # append string to list for sample
-							locusList = list() # make new locustList for next locus
-					sampleStr = ' '.join(sampleList)
-					lineList.append(sampleStr)
-
-
-		fh.close()
-
-		return lineList
+		# write population map in the order individuals appear in the genepop file
+		names = self.geno.inds.tolist()
+		popmapOut = os.path.join(self.convertedDir, "genepopmap.txt")
+		with open(popmapOut, 'w') as fh:
+			for pop in mapDict.keys():
+				fh.write(''.join([names[i] + "\t" + pop + "\n" for i in groups.get(pop, list())]))
+
+		return self.lines(mapDict, groups)
+
+	def lines(self, mapDict, groups):
+		yield 'Title line:""'
+
+		# locus names without allele identifiers
+		for columnName in self.geno.loci:
+			yield columnName
+
+		for pop in mapDict.keys():
+			yield "Pop"
+			yield from self.encodeGenotypes(groups.get(pop, list()))
+
+	def encodeGenotypes(self, rows):
+		# translate the integer allele codes of each locus into 3-digit locus dictionary codes ("000" = missing data),
+		# join both alleles of every locus and yield one line per individual
+		tables = list()
+		for locus, alleles in zip(self.geno.loci, self.geno.alleles):
+			# alleles that were not observed when the locus dictionary was made are never selected by a code
+			table = numpy.array([str(self.ldict[locus].get(allele)) for allele in alleles] + ["000"], dtype=object) # code -1 selects missing data
+			tables.extend([table, table]) # same table for both allele columns
+		codes = self.geno.codes.reshape(len(self.geno.inds), -1) # allele columns in input (_1, _2) order
+		for positions, names, cells in lookupBlocks(self.geno.inds, codes, tables, numpy.asarray(rows, dtype=numpy.int64)):
+			pairs = cells[:, 0::2] + cells[:, 1::2] # elementwise string concatenation
+			for sampleName, row in zip(names, pairs.tolist()):
+				yield sampleName + " ,  " + ' '.join(row)
@@ -0,0 +1,72 @@
+import numpy
+import pandas
+
+class Genotypes():
+	'Class for holding microhap genotypes as pairs of small integer allele codes'
+
+	def __init__(self, df):
+		self.inds = df.index # individual names
+		colNames = list(df.columns)
+		self.loci = [item[:-2] for item in colNames[1::2]] # locus names without allele identifiers
+
+		nInds = len(df)
+		self.alleles = list() # per locus array of allele strings sorted alphabetically; position = allele code
+		self.codes = numpy.full((nInds, len(self.loci), 2), -1, dtype=numpy.int16) # alleles in input (_1, _2) order; -1 = missing data
+
+		for k, locus in enumerate(self.loci):
+			col1 = df[locus + "_1"]
+			col2 = df[locus + "_2"]
+			if isinstance(col1.dtype, pandas.CategoricalDtype) and isinstance(col2.dtype, pandas.CategoricalDtype):
+				uniq, codes1, codes2 = self.fromCategorical(col1, col2)
+			else:
+				both = numpy.concatenate((col1.to_numpy(dtype=object), col2.to_numpy(dtype=object)))
+				codes, uniq = pandas.factorize(both, sort=True) # sorted codes mean lower code = alphabetically first allele
+				codes1, codes2 = codes[:nInds], codes[nInds:]
+			self.alleles.append(numpy.asarray(uniq, dtype=object))
+			self.codes[:, k, 0] = codes1
+			self.codes[:, k, 1] = codes2
+
+		# canonical unordered genotypes: lower allele code first (missing data sorts first)
+		self.pairs = numpy.sort(self.codes, axis=2)
+
+	def fromCategorical(self, col1, col2):
+		# translate the category codes of both allele columns into one sorted allele table without
+		# converting genotypes back to strings
+		cats1 = col1.cat.categories.to_numpy(dtype=object)
+		cats2 = col2.cat.categories.to_numpy(dtype=object)
+		uniq = numpy.array(sorted(set(cats1) | set(cats2)), dtype=object)
+		lookup = {allele: code for code, allele in enumerate(uniq)}
+		map1 = numpy.array([lookup[allele] for allele in cats1] + [-1], dtype=numpy.int16) # code -1 selects missing data
+		map2 = numpy.array([lookup[allele] for allele in cats2] + [-1], dtype=numpy.int16)
+		return uniq, map1[col1.cat.codes.to_numpy()], map2[col2.cat.codes.to_numpy()]
+
+	def columns(self):
+		# genotype column names in input order
+		cols = list()
+		for locus in self.loci:
+			cols.append(locus + "_1")
+			cols.append(locus + "_2")
+		return cols
+
+	def canonical(self):
+		# canonical genotypes as a 2-d matrix with one column per allele slot
+		return self.pairs.reshape(len(self.inds), -1)
+
+	def dropInds(self, names):
+		# returns the allele codes of the removed individuals
+		keep = ~self.inds.isin(names)
+		removed = self.codes[~keep]
+		if not keep.all():
+			self.inds = self.inds[keep]
+			self.codes = self.codes[keep]
+			self.pairs = self.pairs[keep]
+		return removed
+
+	def dropLoci(self, loci):
+		drop = set(loci)
+		keep = [k for k, locus in enumerate(self.loci) if locus not in drop]
+		if len(keep) < len(self.loci):
+			self.loci = [self.loci[k] for k in keep]
+			self.alleles = [self.alleles[k] for k in keep]
+			self.codes = self.codes[:, keep]
+			self.pairs = self.pairs[:, keep]
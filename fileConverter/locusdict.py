@@ -1,71 +1,44 @@
 import collections
 import os
-import pandas
-import matplotlib.pyplot
 
 class LocusDict():
 	'Class for making dict to translate microhap genotypes to integer data'
 
-	def __init__(self, df):
-		self.df = df
+	def __init__(self, summary):
+		self.summary = summary # LocusSummary object
 		self.recodeAlleles = collections.defaultdict(dict)
 		self.alleleCounts = collections.defaultdict(int)
 	
 	def getUnique(self):
-		colNames = list(self.df.columns)
-		dupLoci = [item[:-2] for item in colNames]
-		singleLoci = dupLoci[1::2]
-
-		# for each locus
-		for locus in singleLoci:
-			name1 = locus + "_1"
-			name2 = locus + "_2"
-
-			# find all alleles for the locus (both columns of alleles combined)
-			alleles = list(pandas.concat([self.df[name1], self.df[name2]]).dropna().unique())
-
-			# enumerate all alleles
-			tempdict = dict(enumerate(alleles))
-
-			# swap values and add 101 to original keys to make individual locus dict
-			swap = {value: str(key+101) for key, value in tempdict.items()}
-
-			self.recodeAlleles[locus] = swap
-			#print(swap)
+		self.recodeAlleles.update(self.summary.recode())
 
 		return self.recodeAlleles
 
 	def getFreqs(self):
 		alleleFreqs = collections.defaultdict(dict)
-
-		colNames = list(self.df.columns)
-		dupLoci = [item[:-2] for item in colNames]
-		singleLoci = dupLoci[1::2]
-
-		for locus in singleLoci:
-			name1 = locus + "_1"
-			name2 = locus + "_2"
-
-			# get frequencies - maybe move to new function so not run multiple times
-			freqs = dict(pandas.concat([self.df[name1], self.df[name2]]).dropna().value_counts())
-			#print(freqs)
-
-			alleleFreqs[locus] = freqs
+		alleleFreqs.update(self.summary.freqs())
 
 		return alleleFreqs
 
-	def countAlleles(self):
-		for key in self.recodeAlleles.keys():
-			self.alleleCounts[key] = len(self.recodeAlleles[key])
-			#print(nAlleles)
+	def countAlleles(self, outDir):
+		self.alleleCounts.update(self.summary.nAlleles())
 		
 		# use Counter to count occurrences of each value
 		valCounts = collections.Counter(self.alleleCounts.values())
 		#print(valCounts)	
 
+		# matplotlib is only imported when plots are requested; it is slow to import
+		import matplotlib
+		matplotlib.use("Agg") # non-interactive backend; plots are only written to file
+		import matplotlib.pyplot
+
 		# make histogram of alleles per locus
-		matplotlib.pyplot.bar(list(valCounts.keys()), list(valCounts.values())) # histogram
-		matplotlib.pyplot.title("Allele Counts per Locus")
-		matplotlib.pyplot.xlabel("Alleles per Locus")
-		matplotlib.pyplot.ylabel("Observation Count")
-		matplotlib.pyplot.savefig("histo.png")
+		fig, ax = matplotlib.pyplot.subplots()
+		ax.bar(list(valCounts.keys()), list(valCounts.values())) # histogram
+		ax.set_title("Allele Counts per Locus")
+		ax.set_xlabel("Alleles per Locus")
+		ax.set_ylabel("Observation Count")
+		histPath = os.path.join(outDir, "histo.png")
+		print("Writing histogram of alleles per locus to", histPath)
+		fig.savefig(histPath)
+		matplotlib.pyplot.close(fig) # release figure so repeated calls do not accumulate plots
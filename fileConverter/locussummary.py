@@ -0,0 +1,76 @@
+import numpy
+
+class LocusSummary():
+	'Class for summarizing the alleles observed at every locus in a single pass over encoded genotypes'
+
+	def __init__(self, geno):
+		self.loci = list(geno.loci) # loci that are still in the dataset
+		self.alleles = list(geno.alleles) # per locus array of allele strings; position = allele code
+		self.locusIndex = {locus: k for k, locus in enumerate(self.loci)} # position of each locus in the flat arrays
+
+		# all alleles of all loci share one flat array; alleles of locus k occupy offsets[k]:offsets[k+1]
+		sizes = [len(alleles) for alleles in self.alleles]
+		self.offsets = numpy.concatenate(([0], numpy.cumsum(sizes))).astype(numpy.int64)
+
+		# flatten as (allele slot, individual, locus) so that the first occurrence of an allele matches
+		# the order of appearance when the _1 column is followed by the _2 column
+		ids = self.flatIds(geno.codes, self.offsets[:-1])
+		self.counts = numpy.bincount(ids, minlength=self.offsets[-1]) # number of copies of each allele
+
+		uniq, first = numpy.unique(ids, return_index=True)
+		self.firstSeen = numpy.full(self.offsets[-1], numpy.iinfo(numpy.int64).max, dtype=numpy.int64)
+		self.firstSeen[uniq] = first
+
+	def flatIds(self, codes, offsets):
+		# flat allele ids for all non-missing alleles in a (individuals x loci x 2) code array
+		cells = codes.transpose(2, 0, 1)
+		ids = (cells + offsets).ravel()
+		return ids[cells.ravel() >= 0]
+
+	def removeInds(self, codes):
+		# subtract the alleles of removed individuals; codes must have one column per remaining locus
+		offsets = self.offsets[[self.locusIndex[locus] for locus in self.loci]]
+		removed = numpy.bincount(self.flatIds(codes, offsets), minlength=self.offsets[-1])
+		self.counts -= removed
+
+	def dropLoci(self, loci):
+		drop = set(loci)
+		self.loci = [locus for locus in self.loci if locus not in drop]
+
+	def observed(self, locus):
+		# codes of alleles still present at a locus, in order of first appearance
+		k = self.locusIndex[locus]
+		lo, hi = self.offsets[k], self.offsets[k+1]
+		codes = numpy.flatnonzero(self.counts[lo:hi] > 0)
+		return codes[numpy.argsort(self.firstSeen[lo:hi][codes], kind='stable')]
+
+	def recode(self):
+		# translate alleles into integer data (101, 102, ...) in order of first appearance
+		recodeAlleles = dict()
+		for locus in self.loci:
+			alleles = self.alleles[self.locusIndex[locus]]
+			recodeAlleles[locus] = {alleles[code]: str(i + 101) for i, code in enumerate(self.observed(locus))}
+		return recodeAlleles
+
+	def freqs(self):
+		# number of occurrences of each allele per locus, most common first
+		alleleFreqs = dict()
+		for locus in self.loci:
+			k = self.locusIndex[locus]
+			codes = self.observed(locus)
+			counts = self.counts[self.offsets[k] + codes]
+			order = numpy.argsort(-counts, kind='stable') # ties stay in order of first appearance
+			alleleFreqs[locus] = {self.alleles[k][codes[i]]: int(counts[i]) for i in order}
+		return alleleFreqs
+
+	def nAlleles(self):
+		# number of alleles still present per locus
+		nAlleles = dict()
+		for locus in self.loci:
+			k = self.locusIndex[locus]
+			nAlleles[locus] = int(numpy.count_nonzero(self.counts[self.offsets[k]:self.offsets[k+1]]))
+		return nAlleles
+
+	def monomorphic(self):
+		# loci with exactly one allele remaining
+		return [locus for locus, n in self.nAlleles().items() if n == 1]
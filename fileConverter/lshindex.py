@@ -0,0 +1,129 @@
+import numpy
+
+class LSHIndex():
+	'Class for finding candidate duplicate pairs by bucketing individuals on random subsets of loci'
+
+	maxBucket = 2000 # buckets with more individuals are compared exactly in blocks instead of enumerating their pairs
+
+	def __init__(self, codes, bands, seed=0):
+		self.codes = codes # integer-encoded genotypes; -1 = missing data
+		self.bands = min(bands, codes.shape[1]) # number of disjoint random column subsets
+
+		# split the genotype columns into disjoint random subsets (bands)
+		rng = numpy.random.default_rng(seed)
+		self.subsets = numpy.array_split(rng.permutation(codes.shape[1]), self.bands)
+
+		# number of bands in which each individual has at least one missing call
+		self.incomplete = numpy.zeros(len(codes), dtype=numpy.int64)
+		for subset in self.subsets:
+			self.incomplete += (codes[:, subset] < 0).any(axis=1)
+
+		# counts for the report
+		self.nCandidates = 0 # pairs that share a bucket
+		self.nExact = 0 # pairs compared exactly because of missing data or oversized buckets
+		self.nOversized = 0 # buckets that were too large to enumerate
+		self.oversized = list() # rows of each oversized bucket
+
+	def findPairs(self, engine, thresh):
+		# return row indexes (i < j) and mismatch counts for all pairs with <= thresh mismatches, in row-major order.
+		# A pair is missed by the buckets only if every band holds a mismatch or a call missing in one of the two
+		# individuals. A pair with d <= thresh mismatches is therefore always found in a bucket when the two individuals
+		# together are incomplete in fewer than self.bands - d bands; all other pairs are counted exactly.
+		first, second = self.candidates()
+		counts = engine.countPairs(first, second)
+		firstList = [first]
+		secondList = [second]
+		countList = [counts]
+
+		for i, j, c in self.exactPairs(engine, thresh):
+			firstList.append(i)
+			secondList.append(j)
+			countList.append(c)
+
+		first = numpy.concatenate(firstList)
+		second = numpy.concatenate(secondList)
+		counts = numpy.concatenate(countList)
+		keep = counts <= thresh
+		first, second, counts = first[keep], second[keep], counts[keep]
+
+		# pairs found more than once have the same count; keep one copy of each in row-major order
+		idx = numpy.unique(first * len(self.codes) + second, return_index=True)[1]
+		return first[idx], second[idx], counts[idx]
+
+	def candidates(self):
+		# two individuals become a candidate pair if their genotypes are identical across every column of at least one band
+		nRows = len(self.codes)
+		keys = list()
+		for subset in self.subsets:
+			bucket = numpy.unique(self.codes[:, subset], axis=0, return_inverse=True)[1].ravel()
+			keys.extend(self.bucketPairs(bucket, nRows))
+
+		if not keys:
+			empty = numpy.empty(0, dtype=numpy.int64)
+			return empty, empty
+
+		keys = numpy.unique(numpy.concatenate(keys)) # pairs found in several bands are only counted once
+		self.nCandidates = len(keys)
+
+		return keys // nRows, keys % nRows
+
+	def bucketPairs(self, bucket, nRows):
+		# enumerate all pairs of rows (i < j) that share a bucket; pairs are encoded as i * nRows + j
+		order = numpy.argsort(bucket, kind='stable') # rows within a bucket stay in ascending order
+		bounds = numpy.flatnonzero(numpy.diff(bucket[order])) + 1
+
+		keys = list()
+		for group in numpy.split(order, bounds):
+			if len(group) > self.maxBucket:
+				self.oversized.append(group) # counted exactly by exactPairs
+			elif len(group) > 1:
+				i, j = numpy.triu_indices(len(group), k=1)
+				keys.append(group[i].astype(numpy.int64) * nRows + group[j])
+
+		return keys
+
+	def exactPairs(self, engine, thresh):
+		# yields exact mismatch counts for pairs the buckets cannot guarantee to find
+		slack = self.bands - 1 - thresh # bands in which a pair may be incomplete and still share a bucket
+		values = numpy.unique(self.incomplete)
+		for v in values:
+			rows = numpy.flatnonzero(self.incomplete == v)
+			# each pair is compared once, from the individual with fewer incomplete bands
+			partners = numpy.flatnonzero(self.incomplete >= max(v, slack + 1 - v))
+			if len(partners):
+				nHigher = int((self.incomplete[partners] > v).sum())
+				self.nExact += len(rows) * nHigher
+				if v >= slack + 1 - v:
+					self.nExact += len(rows) * (len(rows) - 1) // 2
+				yield engine.compareRows(rows, partners, thresh)
+
+		for group in self.oversized:
+			self.nOversized += 1
+			self.nExact += len(group) * (len(group) - 1) // 2
+			yield engine.compareRows(group, group, thresh)
+
+	def report(self, thresh, log):
+		nRows = len(self.codes)
+		nPairs = nRows * (nRows - 1) // 2
+		nCompared = min(nPairs, self.nCandidates + self.nExact)
+		pruned = nPairs - nCompared
+		pct = 100.0 * pruned / nPairs if nPairs else 0.0
+		slack = self.bands - 1 - thresh
+
+		lines = list()
+		lines.append(f"Candidate pair index used {self.bands} random locus subsets (bands).")
+		lines.append(f"{self.nCandidates} pairs shared a bucket and {self.nExact} pairs were compared exactly because of missing data or oversized buckets ({self.nOversized} buckets with more than {self.maxBucket} samples).")
+		lines.append(f"At most {nCompared} of {nPairs} pairs were compared; at least {pruned} pairs ({pct:.2f}%) were pruned.")
+		lines.append(f"Recall guarantee: every pair with at most {thresh} mismatches was compared; missing calls are treated as wildcards.")
+		if slack < 0:
+			lines.append(f"WARNING: fewer bands than needed for -T {thresh}; all pairs were compared exactly. Use at least {thresh + 1} bands for the index to prune pairs.")
+		elif self.nExact > self.nCandidates:
+			lines.append(f"WARNING: most comparisons were made exactly because samples have missing calls in many bands. Use more bands or a stricter -i for the index to prune pairs.")
+
+		with open(log, 'a') as fh:
+			fh.write("\n")
+			for line in lines:
+				print(line) #stdout
+				fh.write(line) #log file
+				fh.write("\n")
+		print("")
@@ -1,42 +1,61 @@
 import collections
-import pandas
+import numpy
 
 class MajMin():
 	'Class for identifying major and minor alleles'
 
-	def __init__(self, df, mj, mn, ms):
+	def __init__(self, snps, mj, mn, ms):
 		self.mj = mj # major allele value
 		self.mn = mn # minor allele value
 		self.ms = ms # missing allele value
-		self.pdf = df
+		self.snps = snps # SNPMatrix object holding SNP genotypes as integer codes
 		self.recode12 = collections.defaultdict(dict) #stores major/minor allele for converting to binary format. 2 = missing, 0 = major, 1 = minor
 
+	def countGenotypes(self):
+		# count every genotype of every locus in one pass over the code matrix; genotypes of locus j occupy
+		# offsets[j]:offsets[j+1] of the flat arrays. firstSeen is the first individual with each genotype.
+		codes = self.snps.codes
+		sizes = [len(genotypes) for genotypes in self.snps.genotypes]
+		offsets = numpy.concatenate(([0], numpy.cumsum(sizes))).astype(numpy.int64)
+
+		flat = (codes.astype(numpy.int64) + offsets[:-1]).T.ravel() # locus by locus, individuals in input order
+		counts = numpy.bincount(flat, minlength=offsets[-1])
+		uniq, first = numpy.unique(flat, return_index=True)
+		firstSeen = numpy.full(offsets[-1], numpy.iinfo(numpy.int64).max, dtype=numpy.int64)
+		firstSeen[uniq] = first
+
+		return offsets, counts, firstSeen
+
 	def getMajorMinor(self):
-		# get counts of all genotypes at each locus and put into dictionary
-		for columnName, columnData in self.pdf.items():
+		offsets, genoCounts, firstSeen = self.countGenotypes()
+		for j, columnName in enumerate(self.snps.loci):
 			self.recode12[columnName]["0"] = str(self.ms) #add missing data value to dict
-			alleledict = self.pdf[columnName].value_counts().to_dict()
+
+			# genotypes from most to least common; ties stay in order of first appearance
+			lo, hi = offsets[j], offsets[j+1]
+			observed = numpy.flatnonzero(genoCounts[lo:hi] > 0)
+			order = observed[numpy.lexsort((firstSeen[lo:hi][observed], -genoCounts[lo:hi][observed]))]
+
 			allelecounts = dict() #store allele counts for this locus
-			for key, value in alleledict.items():
+			for code in order:
+				key = self.snps.genotypes[j][code]
 				# ignore missing data values
-				# casting as str() in next line because sometimes Excel encodes as int or string
-				if str(key) != "0":
-					alleles = list(key)
-					for allele in alleles:
-						count = allelecounts.get(allele, 0) #return 0 if key does not exist yet
-						count += value
-						allelecounts[allele] = count
-			#determine major and minor alleles based upon counts
-			major = max(allelecounts, key=allelecounts.get) #get major allele
-			majCount = max(allelecounts.values())
-			minor = min(allelecounts, key=allelecounts.get) #get minor allele
-			minCount = min(allelecounts.values())
-			
+				if key != "0":
+					for allele in key:
+						allelecounts[allele] = allelecounts.get(allele, 0) + int(genoCounts[lo + code])
+
 			#check number of alleles. Print warning if only 1 allele at a locus; exit program if 0 or >2 alleles at locus
 			if len(allelecounts.keys()) == 1:
+				major = max(allelecounts, key=allelecounts.get) #get major allele
 				print("WARNING: locus " + columnName + " is monomorphic in your dataset.")
 				self.recode12[columnName][major] = str(self.mj)
 			elif len(allelecounts.keys()) == 2:
+				#determine major and minor alleles based upon counts
+				major = max(allelecounts, key=allelecounts.get) #get major allele
+				majCount = max(allelecounts.values())
+				minor = min(allelecounts, key=allelecounts.get) #get minor allele
+				minCount = min(allelecounts.values())
+
 				#test if equal number of alleles found
 				if majCount == minCount:
 					alleleNum = self.mj # not a string here because using math
@@ -2,22 +2,54 @@ from ckmrsim import CKMR
 from colony import Colony
 from csvf import CSVfiltered
 from genepop import Genepop
+from majmin import MajMin
 from sequoia import Sequoia
 from snppit import Snppit
+from snpmatrix import SNPMatrix
 
-import collections
+import contextlib
+import copy
+import io
 import json
+import multiprocessing
+import numpy
 import os
 import pandas
+import pickle
+import tempfile
+import time
 import warnings
 
 # PerformanceWarning STFU
 warnings.simplefilter(action='ignore', category=pandas.errors.PerformanceWarning)
 
+converter = None # MHconvert object shared by all formats in a worker process
+
+def initWorker(stateFile):
+	# load the small converter state and memory-map the genotype code matrices read-only
+	global converter
+	with open(stateFile, 'rb') as fh:
+		converter = pickle.load(fh)
+	converter.attachCodes(os.path.dirname(stateFile))
+
+def convertWorker(filetype):
+	# convert to one format in a worker process; returns (format, seconds, captured stdout, exit code or False)
+	text = io.StringIO()
+	exitCode = False
+	start = time.perf_counter()
+	with contextlib.redirect_stdout(text):
+		try:
+			converter.convertOne(filetype)
+		except SystemExit as e:
+			exitCode = e.code # SystemExit would otherwise terminate the worker and stall the pool
+	return filetype, time.perf_counter() - start, text.getvalue(), exitCode
+
 class MHconvert():
 	'Class for converting pandas dataframes into various genotype files'
 
-	def __init__(self, df, infile, ldict, cDat, derr, gerr, pm, pf, runname, inbreed, runlen, cdir, afreqs, snppitCols, pops, snppitmap, snpDict, colErr):
+	batch = 10000 # number of output lines written at a time
+
+	def __init__(self, df, infile, ldict, cDat, derr, gerr, pm, pf, runname, inbreed, runlen, cdir, afreqs, snppitCols, pops, snppitmap, snpDict, colErr, geno, threads, snpCoords):
 		self.df = df
 		self.ldict = ldict
 		self.infile = infile
@@ -31,73 +63,143 @@ class MHconvert():
 		self.runlen = runlen
 		self.suffix = {'ckmr': 'tsv', 'colony': 'Dat', 'csv': 'csv', 'genepop': 'genepop', 'sequoia': 'sequoia', 'snppit': 'snppit'}
 		self.convertedDir = cdir # directory to hold converted files
-		self.snpdf = pandas.DataFrame() #dataframe to hold SNPs if SNP output option is used
+		self.snps = None # SNPMatrix object; created by convSNP if SNP output option is used
+		self.recode12 = None # major/minor allele table of SNP loci; created on first use by getMajorMinor
 		self.alleleFreqs = afreqs
 		self.snppitCols = snppitCols
 		self.pops = pops # dict of population information for all individuals
 		self.snppitmap = snppitmap
 		self.snpDict = snpDict # dict of booleans for snp file formats
 		self.colErr = colErr # file of marker-specific error rates for colony; 
+		self.geno = geno # Genotypes object with integer allele codes matching the filtered dataframe
+		self.threads = threads # number of processes for converting to several formats at the same time
+		self.snpCoords = snpCoords # json file of pinned SNP positions per locus; created if it does not exist
 		#print("printing snpdict")
 		#print(self.snpDict)
 		
 		# add if statement here to only do SNP conversion if SNP file formats requested
 		if any(self.snpDict.values()):
 			print("At least one SNP-based file format was requested.")
-			kd = self.findSNP(self.df) # identify SNP positions to keep for SNP format output files
+			if self.snpCoords and os.path.isfile(self.snpCoords):
+				kd = self.loadSNP(self.snpCoords) # reuse pinned SNP positions
+			else:
+				kd = self.findSNP(self.df) # identify SNP positions to keep for SNP format output files
+				if self.snpCoords:
+					print("Pinning retained SNP coordinates to", self.snpCoords, "for later runs.")
+					with open(self.snpCoords, 'w') as f:
+						json.dump(kd, f, indent='\t')
 			print("Writing dictionary of retained SNP coordinates to RetainedSNPcoordinates.json")
 			print("Coordinates are provided relative to SNP position in microhaplotype allele strings provided per locus in your input file.")
 			jsonpath = os.path.join(os.getcwd(), "RetainedSNPcoordinates.json")
 			with open(jsonpath, 'w') as f:
 				json.dump(kd, f, indent='\t') # write dict to json file recording positions of snps retained from each locus
 
-			self.snpDF = self.convSNP(kd, self.df) # make dataframe of SNPs
-
-			## uncomment to test whether snpDF is being written correctly
-			#self.snpDF.to_excel('output.xlsx', index=True)
+			self.convSNP(kd) # extract SNP genotypes
 
 
 	def convert(self, d):
-		output = list()
-		for filetype, boolean in d.items():
-			if boolean == True:
-				print("\nConverting to", filetype, "format file.")
-				output = self.convert_to(filetype)
-				self.printOutput(output, self.infile, self.suffix[filetype])
+		requested = [filetype for filetype, boolean in d.items() if boolean == True]
+		if self.threads > 1 and len(requested) > 1:
+			self.convertParallel(requested)
+			return
+
+		for filetype in requested:
+			print("\nConverting to", filetype, "format file.")
+			start = time.perf_counter()
+			self.convertOne(filetype)
+			print(f"Finished {filetype} format in {time.perf_counter() - start:.2f} seconds.")
+
+	def convertParallel(self, requested):
+		# every format reads the same filtered data and writes its own files, so formats are converted in
+		# separate processes. Messages from each format are printed in the usual order once it finishes.
+		nProcs = min(self.threads, len(requested))
+		print(f"\nConverting to {len(requested)} formats using {nProcs} processes.")
+		start = time.perf_counter()
+
+		# write the genotype code matrices to disk once; workers memory-map them read-only so they are shared
+		# through the page cache, and only receive the path of a small file with the remaining state
+		with tempfile.TemporaryDirectory() as tmpdir:
+			stateFile = self.shareState(tmpdir)
+			ctx = multiprocessing.get_context("spawn")
+			with ctx.Pool(nProcs, initializer=initWorker, initargs=(stateFile,)) as pool:
+				for filetype, seconds, text, exitCode in pool.imap(convertWorker, requested):
+					print("\nConverting to", filetype, "format file.")
+					print(text, end="")
+					if exitCode is not False:
+						pool.terminate()
+						raise SystemExit(exitCode)
+					print(f"Finished {filetype} format in {seconds:.2f} seconds.")
+		print(f"\nFinished all formats in {time.perf_counter() - start:.2f} seconds.")
+
+	def shareState(self, tmpdir):
+		# returns the path of a copy of this object without the dataframe and code matrices;
+		# the matrices are saved next to it and attached again by attachCodes in each worker
+		state = copy.copy(self)
+		state.df = None # writers only read the encoded genotypes
+		state.geno = copy.copy(self.geno)
+		state.geno.codes = None
+		state.geno.pairs = None # canonical pairs are not used by the writers
+		numpy.save(os.path.join(tmpdir, "geno.npy"), self.geno.codes)
+		if self.snps is not None:
+			state.snps = copy.copy(self.snps)
+			state.snps.codes = None
+			numpy.save(os.path.join(tmpdir, "snps.npy"), self.snps.codes)
+
+		stateFile = os.path.join(tmpdir, "state.pkl")
+		with open(stateFile, 'wb') as fh:
+			pickle.dump(state, fh)
+		return stateFile
+
+	def attachCodes(self, tmpdir):
+		self.geno.codes = numpy.load(os.path.join(tmpdir, "geno.npy"), mmap_mode='r')
+		if self.snps is not None:
+			self.snps.codes = numpy.load(os.path.join(tmpdir, "snps.npy"), mmap_mode='r')
+
+	def convertOne(self, filetype):
+		output = self.convert_to(filetype)
+		if output is not None: # delimited formats are written directly by their converters
+			self.printOutput(output, self.infile, self.suffix[filetype])
 
 	def conv_csv(self):
 		#print("This function will print a filtered .csv file")
-		csv = CSVfiltered(self.df)
-		output = csv.convert()
-		return output
+		csv = CSVfiltered(self.geno)
+		csv.convert(self.outputName(self.infile, self.suffix['csv']))
 	
 	def conv_ckmr(self):
 		#print("This function will print a filtered .csv file for ckmr format")
-		tsv = CKMR(self.df, self.cDat)
-		output = tsv.convert()
-		return output
+		tsv = CKMR(self.geno, self.cDat)
+		outOffspring = os.path.join(self.convertedDir, "ckmrsim.offspring.tsv")
+		outParents = os.path.join(self.convertedDir, "ckmrsim.parents.tsv")
+		tsv.convert(outOffspring, outParents)
 
 	def conv_colony(self): 
 		#print("This function will convert to colony format.")
-		cy = Colony(self.df, self.ldict, self.cDat, self.derr, self.gerr, self.pmale, self.pfemale, self.runname, self.inbreed, self.runlen, self.colErr)
+		cy = Colony(self.geno, self.ldict, self.cDat, self.derr, self.gerr, self.pmale, self.pfemale, self.runname, self.inbreed, self.runlen, self.colErr)
 		output = cy.convert()
 		return output
 
 	def conv_genepop(self): 
 		#print("This function will convert to genepop format.")
-		gen = Genepop(self.df, self.pops, self.convertedDir, self.ldict)
+		gen = Genepop(self.geno, self.pops, self.convertedDir, self.ldict)
 		output = gen.convert()
 		return output
 
 	def conv_sequoia(self):
 		#print("This function will convert to sequoia format.")
-		seq = Sequoia(self.snpDF, self.convertedDir)
+		seq = Sequoia(self.snps, self.convertedDir, self.getMajorMinor())
 		output = seq.convert(self.snppitCols)
 		return output
 	
+	def getMajorMinor(self):
+		# major/minor allele table of the SNP loci; computed once per filtered dataset
+		if self.recode12 is None:
+			mm = MajMin(self.snps, 0, 1, 2)
+			self.recode12 = mm.getMajorMinor()
+		return self.recode12
+
 	def conv_snppit(self):
 		#print("This function will convert to SNPPIT format.")
-		snppit = Snppit(self.snpDF, self.pops)
+		snppit = Snppit(self.snps, self.pops)
 		output = snppit.convert(self.snppitmap, self.snppitCols)
 		return output
 	
@@ -113,140 +215,86 @@ class MHconvert():
 			raise SystemExit(1)
 		return output
 
-	def printOutput(self, output, fileName, suffix):
+	def outputName(self, fileName, suffix):
 		# if colony conversion, use Colony2.Dat as output name
-		outParents = None
-		outOffspring = None
 		if suffix == "Dat":
-			outName = os.path.join(self.convertedDir, "Colony2.Dat")
-		elif suffix == "tsv":
-			#print("reached tsv block")
-			outParents = os.path.join(self.convertedDir, "ckmrsim.parents.tsv")
-			outOffspring = os.path.join(self.convertedDir, "ckmrsim.offspring.tsv")
-		else:
-			# make new file name for writing
-			fileName = fileName.replace(" ", "_") #replace spaces in original filename if they exist
-			nameList = fileName.split('.')
-			nameList.pop() #remove old extension
-			nameList.append(suffix) #add new file extension
-			outName = '.'.join(nameList)
-			outName = os.path.join(self.convertedDir, outName)
-
-		# this is a little janky. Basically I packaged the offspring and parents genotypes into
-		# a single list and I cound the number of header lines to determine whether I'm writing
-		# to the offspring (first batch in list) or parents (second batch). 
-		if outOffspring:
-			print("Writing to", outOffspring, "and", outParents)
-			print("")
-			counter=0
-			fhp = open(outParents, 'w')
-			fho = open(outOffspring, 'w')
-			for line in output:
-				if line.startswith("indiv\t"):
-					counter+=1
-				if counter == 1:
-					fho.write(line)
-					fho.write("\n")
-				elif counter == 2:
-					fhp.write(line)
-					fhp.write("\n")
-				else:
-					fhp.close()
-					fho.close()
-					print("There shouldn't be data for a third file in CKMRsim output.")
-					print("How did you get here?")
-					print("")
-					raise SystemExit(1)
-			fhp.close()
-			fho.close()
-		else:
-			print("Writing to", outName)
-			print("")
-
-			fh = open(outName, 'w')
-			for line in output:
-				fh.write(line)
-				fh.write("\n")
-			fh.close()
+			return os.path.join(self.convertedDir, "Colony2.Dat")
 
-	def convSNP(self, kd, df):
-		print("Making new SNP dataframe.\n")
-		newDF = df.copy(deep=True) # make deep copy of microhap dataframe
-		snpDF = pandas.DataFrame() # make dataframe that will hold SNP calls
-		for locus, pos in kd.items():
-			name1 = locus + "_1"
-			name2 = locus + "_2"
-
-			newDF[name1] = newDF[name1].str.slice(pos, pos+1) # extract SNP allele 1
-			newDF[name2] = newDF[name2].str.slice(pos, pos+1) # extract SNP allele 2
+		# make new file name for writing
+		fileName = fileName.replace(" ", "_") #replace spaces in original filename if they exist
+		nameList = fileName.split('.')
+		nameList.pop() #remove old extension
+		nameList.append(suffix) #add new file extension
+		outName = '.'.join(nameList)
+		return os.path.join(self.convertedDir, outName)
 
-			snpDF[locus] = newDF[name1] + newDF[name2] # concatenate SNP alleles 1 and 2
-			snpDF[locus] = snpDF[locus].apply(lambda x: ''.join(sorted(str(x))) if pandas.notna(x) else "0") # sort new string
+	def printOutput(self, output, fileName, suffix):
+		# output may be any iterable of lines (converters return generators); lines are written in batches
+		outName = self.outputName(fileName, suffix)
+		print("Writing to", outName)
+		print("")
 
-			# comment above line and uncomment next two lines for alternate handling of NA values
-			#snpDF[locus] = snpDF[locus].apply(lambda x: ''.join(sorted(str(x)))) # sort new string
-		#snpDF.replace('ann', pandas.NA, inplace=True) # make sure NA values are treated properly
-		#print(snpDF)
+		with open(outName, 'w') as fh:
+			batch = list()
+			for line in output:
+				batch.append(line)
+				if len(batch) >= self.batch:
+					fh.write("\n".join(batch) + "\n")
+					batch = list()
+			if batch:
+				fh.write("\n".join(batch) + "\n")
 
-		return snpDF
+	def convSNP(self, kd):
+		print("Making new SNP dataframe.\n")
+		self.snps = SNPMatrix(self.geno, kd) # SNP genotypes of all loci as a compact integer matrix
 
 	def findSNP(self, df):
 		print("SNP file format output invoked - Finding SNPs with highest MAC values per locus.\n")
-		superDict = dict() # will hold nested dicts created for each locus
 		colNames = list(self.df.columns)
 		dupLoci = [item[:-2] for item in colNames]
 		singleLoci = dupLoci[1::2]
 
-		for locus in singleLoci:
-			locDict = collections.defaultdict(lambda: collections.defaultdict(int)) # nested dict of dicts with default int value so that I can add value without first needing to check if key already exists
-
+		# one row per allele of every locus: locus number, allele count and code point of each character (0 = past the end)
+		alleles = list()
+		counts = list()
+		locusIds = list()
+		for j, locus in enumerate(singleLoci):
 			for key, val in self.alleleFreqs[locus].items():
-				hapList = list(key)
-				count=0
-				for char in hapList:
-					locDict[count][char] += int(val)
-					count += 1
+				alleles.append(str(key))
+				counts.append(int(val))
+				locusIds.append(j)
+		chars = numpy.array(alleles, dtype=str)
+		width = max(chars.dtype.itemsize // 4, 1) # length of longest allele
+		chars = chars.view(numpy.uint32).reshape(len(alleles), width).astype(numpy.int64)
+		counts = numpy.array(counts, dtype=numpy.int64)
+		locusIds = numpy.array(locusIds, dtype=numpy.int64)
 
-			superDict[locus] = locDict # superDict holds all individual locDicts
+		# count every nucleotide at every position of every locus at once; sites are (locus, position) pairs
+		site = locusIds[:, None] * width + numpy.arange(width)
+		keys = site * 0x110000 + chars
+		present = chars > 0
+		uniq, inverse = numpy.unique(keys[present], return_inverse=True)
+		nucCounts = numpy.bincount(inverse, weights=numpy.broadcast_to(counts[:, None], chars.shape)[present]).astype(numpy.int64)
+		sites, first, nNucs = numpy.unique(uniq // 0x110000, return_index=True, return_counts=True)
 
-		## uncomment next 3 lines to verify nested dict format was created as desired
-		#jsonpath = os.path.join(os.getcwd(), "snpMinorAlleleCountsDict.json")
-		#with open(jsonpath, 'w') as jsonfile:
-		#	json.dump(superDict, jsonfile, indent='\t')
+		# biallelic sites and their minor allele counts
+		biallelic = nNucs == 2
+		mac = numpy.minimum.reduceat(nucCounts, first) if len(first) else numpy.zeros(0, dtype=numpy.int64)
+		sites = sites[biallelic]
+		mac = mac[biallelic]
+
+		# position with greatest minor allele count per locus; ties go to the first position
+		order = numpy.lexsort((sites % width, -mac, sites // width))
+		bestLoci, bestIdx = numpy.unique(sites[order] // width, return_index=True)
+		best = {int(j): int(sites[order][k] % width) for j, k in zip(bestLoci, bestIdx)}
 
 		removeList = list() # hold loci that will be removed from dataframe because there are no biallelic SNPs
 		keepDict = dict()
-		for locus, d in superDict.items():
-			potentialKeep = list()
-			for position, d2 in d.items():
-				# test if position is biallelic
-				if len(d2) == 2:
-					potentialKeep.append(position) # record biallelic positions
-
-			# find loci with no biallelic positions and push to removeList
-			if len(potentialKeep) == 0:
-				removeList.append(locus)
-			# if single biallelic position, push locus and position to keepDict
-			elif len(potentialKeep) == 1:
-				keepDict[locus] = potentialKeep[0]
-			# if multiple biallelic positions, find position with greatest minor allele count
+		for j, locus in enumerate(singleLoci):
+			if j in best:
+				keepDict[locus] = best[j]
 			else:
-				mac = dict() # dict to hold all minor allele counts for locus
-				for position in potentialKeep:
-					# determine minor allele at each position
-					minAllele = min(superDict[locus][position], key=superDict[locus][position].get)
-
-					# record minor allele count for position in mac dict
-					mac[position] = superDict[locus][position][minAllele]
-				
-				# get position that has minor allele with greatest minor allele count
-				maxminAllele = max(mac, key=mac.get)
-				keepDict[locus] = maxminAllele # add retained position to keepDict
-				#print(mac)
-		
-		#print(removeList)
-			
-		#print(keepDict)
+				removeList.append(locus)
 
 		if removeList:
 			print("The following loci were removed from SNP file outputs because they contained no biallelic SNPs:")
@@ -256,3 +304,27 @@ class MHconvert():
 
 		return keepDict
 
+	def loadSNP(self, coordFile):
+		# reuse a pinned panel of SNP positions; loci that are no longer in the dataset are skipped
+		print("Reading retained SNP coordinates from", coordFile, "instead of selecting SNPs.\n")
+		with open(coordFile, 'r') as f:
+			pinned = json.load(f)
+
+		colNames = list(self.df.columns)
+		singleLoci = [item[:-2] for item in colNames][1::2]
+		keepDict = {locus: int(pinned[locus]) for locus in singleLoci if locus in pinned}
+
+		missing = [locus for locus in pinned if locus not in keepDict]
+		if missing:
+			print("The following loci in", coordFile, "are not in the filtered dataset and were skipped:")
+			for l in missing:
+				print(str(l))
+			print("\n")
+		unpinned = [locus for locus in singleLoci if locus not in pinned]
+		if unpinned:
+			print("The following loci are not in", coordFile, "and were removed from SNP file outputs:")
+			for l in unpinned:
+				print(str(l))
+			print("\n")
+
+		return keepDict
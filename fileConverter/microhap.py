@@ -2,22 +2,44 @@ import os
 import pandas
 import sys
 
+from csvcache import CSVCache
 from duplicates import Duplicates
+from genotypes import Genotypes
 from locusdict import LocusDict
+from locussummary import LocusSummary
+from missingness import Missingness
+from popfilter import PopFilter
+from streamreader import StreamReader
+from sweep import ThresholdSweep
 
 class Microhap():
 	'Class for operating on microhap genotype files'
 
-	def __init__(self, infile, pmissLoc, pmissInd, mono, dup, t, k):
+	def __init__(self, infile, pmissLoc, pmissInd, mono, dup, t, k, threads, bands, refIndex, plots, outDir, cache, compact, stream, converge, pmissLocPop, monoPop, removeLoci, removeInds):
 		self.mhFile = infile #input file name
 		self.df = pandas.DataFrame()
 		self.pmissLoc = pmissLoc # allowable proportion of missing data locus
 		self.pmissInd = pmissInd # allowable proportion of missing data individual
 		self.colonyData = pandas.DataFrame()
+		self.geno = None # Genotypes object holding integer allele codes; created by parseFile
+		self.summary = None # LocusSummary object with allele counts per locus; created by parseFile
+		self.missing = None # Missingness object with missing data counts; created by parseFile
 		self.mono = mono # boolean to control monomorphic locus filter
 		self.dup = dup # boolean to control duplicate identification
 		self.dupThresh = t # threshold for identifying duplicate individuals
 		self.keepDups = k # method for keeping duplicates
+		self.threads = threads # number of processes for duplicate identification
+		self.bands = bands # number of locus subsets for the duplicate candidate pair index
+		self.refIndex = refIndex # persistent index of genotypes from earlier runs for duplicate identification
+		self.plots = plots # boolean to control writing of summary plots
+		self.outDir = outDir # directory for converted files and plots
+		self.cache = cache # boolean to control use of binary cache of the input file
+		self.compact = compact # boolean to control reading allele columns as categorical data
+		self.stream = stream # number of rows per chunk when streaming the input file (0 = read all at once)
+		self.streamed = None # StreamReader object holding summaries of the complete input file; created when streaming
+		self.converge = converge # boolean to control repeating missing data filters until nothing is removed
+		self.pmissLocPop = pmissLocPop # allowable proportion of missing data for a locus within any population (None = not used)
+		self.monoPop = monoPop # boolean to control filter of loci that are monomorphic for the same allele in every population
 
 		# deal with input file name to create log file name
 		fn, ext = os.path.splitext(infile)
@@ -34,27 +56,102 @@ class Microhap():
 		
 		print("Reading input .csv file.")
 		print("")
-		self.df = pandas.read_csv(self.mhFile, index_col=0, header=0)
+		if self.stream > 0:
+			# drop individuals that fail the missing data filter while reading
+			self.streamed = StreamReader(self.mhFile, self.stream, self.pmissInd, removeLoci, removeInds)
+			self.df = self.streamed.read()
+		elif self.cache == True:
+			# reuse parsed input from previous runs if the input file has not changed
+			csvCache = CSVCache(self.mhFile, self.compact)
+			self.df = csvCache.load()
+			if self.df is None:
+				self.df = self.readCSV()
+				csvCache.save(self.df)
+		else:
+			self.df = self.readCSV()
 
 
-	def runFilters(self):
-		# filter individuals
-		self.filterInds()
-		
-		# filter loci
-		self.filterLoci()
+	def readCSV(self):
+		if self.compact == True:
+			# read allele columns as categorical data so that each distinct allele is stored once per column
+			# and every genotype becomes a small integer code (-1 = missing data)
+			print("Reading allele columns in compact (categorical) format.\n")
+			header = pandas.read_csv(self.mhFile, index_col=0, header=0, nrows=0)
+			alleleCols = [col for col in header.columns if col.endswith(("_1", "_2"))]
+			df = pandas.read_csv(self.mhFile, index_col=0, header=0, dtype={col: 'category' for col in alleleCols})
+		else:
+			df = pandas.read_csv(self.mhFile, index_col=0, header=0)
+
+		return df
+
+
+	def runFilters(self, pops):
+		if self.converge == True:
+			# alternate individual and locus filters until neither removes anything
+			self.filterConverge(pops)
+		else:
+			# filter individuals
+			self.filterInds()
+			
+			# filter loci
+			self.filterLoci()
+			if self.pmissLocPop is not None:
+				self.filterLociByPop(pops)
 
 		# find duplicates
 		if self.dup:
-			dups = Duplicates(self.df, self.dupThresh, self.keepDups, self.log)
+			dups = Duplicates(self.geno, self.dupThresh, self.keepDups, self.log, self.threads, self.bands, self.refIndex, os.path.basename(self.mhFile))
 			dups.findDups()
 			removeList = dups.removeDups() # get list of individuals to remove
+			dups.updateIndex(removeList) # add retained individuals to reference index (if invoked)
 			if removeList:
 				self.dropRows(removeList) # drop duplicate individuals
 
 		# remove monomorphic loci
 		if self.mono == True:
 			self.filterMono()
+		if self.monoPop == True:
+			self.filterMonoByPop(pops)
+
+
+	def filterConverge(self, pops):
+		# missing data counts are updated incrementally by dropRows and dropColumns, so each round
+		# only revisits the individuals and allele columns affected by the previous removals
+		rounds = list() # individuals and loci removed per round
+		while True:
+			nRound = len(rounds) + 1
+			print("\nMissing data filter round " + str(nRound) + ":")
+			with open(self.log, 'a') as fh:
+				fh.write("\nMissing data filter round " + str(nRound) + ":\n")
+
+			nInds = len(self.missing.inds)
+			nCols = int(self.missing.keepCols.sum())
+			self.filterInds(nRound == 1) # individuals dropped while streaming are reported in the first round
+			self.filterLoci()
+			if self.pmissLocPop is not None:
+				self.filterLociByPop(pops)
+			removedInds = nInds - len(self.missing.inds)
+			if nRound == 1 and self.streamed is not None:
+				removedInds += len(self.streamed.dropped)
+			removedLoci = int((nCols - int(self.missing.keepCols.sum()))/2)
+			rounds.append([nRound, removedInds, removedLoci])
+
+			if removedInds == 0 and removedLoci == 0:
+				break
+
+		summary = pandas.DataFrame(rounds, columns=["Round", "Individuals removed", "Loci removed"])
+		print("\nMissing data filters converged after " + str(len(rounds)) + " rounds:")
+		print(summary.to_string(index=False))
+		with open(self.log, 'a') as fh:
+			fh.write("\nMissing data filters converged after " + str(len(rounds)) + " rounds:\n")
+			fh.write(summary.to_string(index=False))
+			fh.write("\n")
+
+
+	def sweepThresholds(self, indGrid, locGrid, pops):
+		# report individuals and loci that would pass the missing data filters for every pair of thresholds
+		sweep = ThresholdSweep(self.missing, pops, self.log, self.outDir)
+		sweep.run(indGrid, locGrid)
 
 
 	def getLog(self):
@@ -62,6 +159,8 @@ class Microhap():
 
 
 	def getCounts(self):
+		if self.streamed is not None:
+			return self.streamed.popCounts # includes individuals dropped while streaming
 		indsPerPop = self.df['Population ID'].value_counts().to_dict()
 		return indsPerPop
 
@@ -75,14 +174,18 @@ class Microhap():
 
 
 	def getDict(self):
-		ld = LocusDict(self.df)
+		if self.streamed is not None:
+			return self.streamed.ldict
+		ld = LocusDict(self.summary)
 		ldict = ld.getUnique()
 		#ld.countAlleles()
 		return ldict
 
 
 	def getFreqs(self):
-		ld = LocusDict(self.df)
+		if self.streamed is not None:
+			return self.streamed.freqs
+		ld = LocusDict(self.summary)
 		freqs = ld.getFreqs()
 		return freqs
 
@@ -117,6 +220,10 @@ class Microhap():
 				print("Make sure all locus columns in your input file end in _1 or _2.\n")
 				raise SystemExit(1)
 
+		# encode genotypes once as integer allele codes and summarize alleles per locus
+		self.geno = Genotypes(self.df)
+		self.summary = LocusSummary(self.geno)
+		self.missing = Missingness(self.geno) # null mask of all genotypes; updated as individuals and loci are removed
 
 		return self.colonyData
 
@@ -130,6 +237,9 @@ class Microhap():
 			print("Exiting program...\n")
 			raise SystemExit(1)
 
+		if self.streamed is not None:
+			pops = self.streamed.pops # includes individuals dropped while streaming
+
 		return pops
 
 
@@ -163,8 +273,23 @@ class Microhap():
 		return junk
 
 	
+	def getGenotypes(self):
+		return self.geno
+
+
 	def dropRows(self, removelist):
 		self.df.drop(removelist, axis=0, inplace=True) # remove individuals
+		removed = self.geno.dropInds(removelist)
+		self.summary.removeInds(removed) # update allele counts
+		self.missing.dropInds(removelist) # update missing data counts
+
+
+	def dropColumns(self, removelist):
+		self.df.drop(removelist, axis=1, inplace=True) # remove locus columns
+		loci = [col[:-2] for col in removelist]
+		self.geno.dropLoci(loci)
+		self.summary.dropLoci(loci)
+		self.missing.dropColumns(removelist)
 
 	
 	def removeInds(self, blacklist):
@@ -203,27 +328,21 @@ class Microhap():
 				with open(self.log, 'a') as fh:
 					fh.write(a1)
 					fh.write("\n")
-				self.df.pop(a1)
+				self.dropColumns([a1])
 			if a2 in self.df.columns:
 				print(a2) # print to stdout
 				# write to log
 				with open(self.log, 'a') as fh:
 					fh.write(a1)
 					fh.write("\n")
-				self.df.pop(a2)
+				self.dropColumns([a2])
 
 
 	def filterMono(self):
-		removeLoci = list()
-		findMono = LocusDict(self.df)
-		mono = findMono.getUnique()
-		findMono.countAlleles()
-		#print(mono)
-		#with open("mono.json", 'w') as jfile:
-		#	json.dump(mono, jfile, indent='\t')
-		for key, val in mono.items():
-			if len(mono[key]) == 1:
-				removeLoci.append(key)
+		if self.plots == True:
+			findMono = LocusDict(self.summary)
+			findMono.countAlleles(self.outDir) # histogram of alleles per locus
+		removeLoci = self.summary.monomorphic() # loci with a single remaining allele
 		print("\nRemoving monomorphic loci:")
 		with open(self.log, 'a') as fh:
 			fh.write("\nRemoving monomorphic loci:\n")
@@ -237,14 +356,14 @@ class Microhap():
 					with open(self.log, 'a') as fh:
 						fh.write(a1)
 						fh.write("\n")
-					self.df.pop(a1)
+					self.dropColumns([a1])
 				if a2 in self.df.columns:
 					print(a2) # write to stdout
 					# write to log
 					with open(self.log, 'a') as fh:
 						fh.write(a1)
 						fh.write("\n")
-					self.df.pop(a2)
+					self.dropColumns([a2])
 			with open(self.log, 'a') as fh:
 				fh.write("\n")
 		else:
@@ -254,15 +373,26 @@ class Microhap():
 
 
 	def calcMissingLocPCT(self):
-		# get number of individuals
-		nInds = len(self.df)
-		
-		missLoc = self.df.isnull().sum(axis=0) # count missing genotypes per column (locus)
-		missLocPCT = missLoc / nInds # divide missing data series by number of individuals
+		# missing genotypes per column (locus) divided by number of individuals
+		missLocPCT = self.missing.locPCT()
 
 		return missLocPCT
 
 
+	def startMissingLocPCT(self):
+		# missing data per locus before any filters; streamed input was summarized before individuals were dropped
+		if self.streamed is not None:
+			return self.streamed.missLocPCT
+		return self.calcMissingLocPCT()
+
+
+	def startMissingIndPCT(self):
+		# missing data per individual before any filters
+		if self.streamed is not None:
+			return self.streamed.missIndPCT
+		return self.calcMissingIndPCT()
+
+
 	def filterLoci(self):
 		# get number of loci
 		if len(self.df.columns)%2 == 0: # test if even number of columns
@@ -295,33 +425,70 @@ class Microhap():
 			fh.write(missRecords.to_string(index=True))
 			fh.write("\n")
 
-		self.df.drop(removeLocPCT, axis=1, inplace=True)
+		self.dropColumns(removeLocPCT.to_list())
 
 	
-	def calcMissingIndPCT(self):
-		# get number of individuals
-		nInds = len(self.df)
-		
-		# get number of loci
-		if len(self.df.columns)%2 == 0: # test if even number of columns
-			nAlleles = len(self.df.columns) # calculate number of alleles per ind
+	def filterLociByPop(self, pops):
+		# remove loci that exceed the missing data threshold in at least one population
+		popFilter = PopFilter(self.geno, self.missing, pops)
+		maxMiss = popFilter.maxMissing() # worst population of every locus
+		missRecords = maxMiss[maxMiss["Missing"] > self.pmissLocPop]
+
+		print("\nMissing data proportion per removed locus in its worst population:") # write to stdout
+		# write to log
+		with open(self.log, 'a') as fh:
+			fh.write("\nMissing data proportion per removed locus in its worst population:\n")
+		print(missRecords.to_string(index=True)) # write to stdout
+		# write to log
+		with open(self.log, 'a') as fh:
+			fh.write(missRecords.to_string(index=True))
+			fh.write("\n")
+
+		removeCols = [locus + suffix for locus in missRecords.index for suffix in ("_1", "_2")]
+		self.dropColumns([col for col in removeCols if col in self.df.columns])
+
+
+	def filterMonoByPop(self, pops):
+		# remove loci with at most one allele across all populations; loci fixed for different alleles in different populations are kept
+		popFilter = PopFilter(self.geno, self.missing, pops)
+		removeLoci = popFilter.monomorphic()
+		print("\nRemoving loci that are monomorphic for the same allele in every population:")
+		with open(self.log, 'a') as fh:
+			fh.write("\nRemoving loci that are monomorphic for the same allele in every population:\n")
+		if removeLoci:
+			print("\n".join(removeLoci)) # write to stdout
+			# write to log
+			with open(self.log, 'a') as fh:
+				fh.write("\n".join(removeLoci))
+				fh.write("\n")
+			removeCols = [locus + suffix for locus in removeLoci for suffix in ("_1", "_2")]
+			self.dropColumns([col for col in removeCols if col in self.df.columns])
 		else:
+			print("None found!")
+			with open(self.log, 'a') as fh:
+				fh.write("None found!\n")
+
+	
+	def calcMissingIndPCT(self):
+		# test if even number of columns
+		if len(self.df.columns)%2 != 0:
 			print("\nERROR: Odd count of locus columns post-missing data (locus) filter.")
 			print("Exiting program...\n")
 			raise SystemExit
 
-		missInd = self.df.isnull().sum(axis=1) # count missing genotypes per individual
-		missIndPCT = missInd / nAlleles # divide missing data series by number of alleles
+		missIndPCT = self.missing.indPCT() # missing genotypes per individual divided by number of alleles
 		
 		return missIndPCT
 		
 	
-	def filterInds(self):
+	def filterInds(self, reportStreamed=True):
 		missIndPCT = self.calcMissingIndPCT()
 
 		removeIndPCT = missIndPCT[missIndPCT > self.pmissInd].index.to_list() # get list of row indexes to remove
 		# print records that didn't pass missing data filter
 		missRecords = missIndPCT.loc[missIndPCT.index.intersection(removeIndPCT)]
+		if self.streamed is not None and reportStreamed:
+			missRecords = pandas.concat([self.streamed.dropped, missRecords]) # individuals dropped while streaming
 
 		print("\nMissing data proportion per individual (indiv):") # write to stdout
 		# write to log
@@ -31,7 +31,7 @@ def main():
 		if key in snpList:
 			snpDict[key] = value
 
-	mhFile = Microhap(input.args.infile, input.args.pmissloc, input.args.pmissind, input.args.mono, input.args.dups, input.args.dupthresh, input.args.keepdups) #initialize new file
+	mhFile = Microhap(input.args.infile, input.args.pmissloc, input.args.pmissind, input.args.mono, input.args.dups, input.args.dupthresh, input.args.keepdups, input.args.threads, input.args.bands, input.args.refindex, input.args.plots, convertedDir, input.args.cache, input.args.compact, input.args.stream, input.args.converge, input.args.pmisslocpop, input.args.monopop, input.args.removeloci, input.args.removeinds) #initialize new file
 	logfile = mhFile.getLog() # retrieve logfile name
 
 	startIndsPerPop = mhFile.getCounts() # get counts of individuals per population at beginning of analysis
@@ -52,8 +52,8 @@ def main():
 		raise SystemExit(1)
 
 	# calculate beginning stats before removing any loci/individuals
-	mLocStart = mhFile.calcMissingLocPCT()
-	mIndStart = mhFile.calcMissingIndPCT()
+	mLocStart = mhFile.startMissingLocPCT()
+	mIndStart = mhFile.startMissingIndPCT()
 
 	mLocStartList = pandas.Series(mLocStart).to_list()
 	mIndStartList = pandas.Series(mIndStart).to_list()
@@ -72,7 +72,13 @@ def main():
 		mhFile.removeLoci(input.args.removeloci) # remove blacklisted loci (if invoked)
 	if input.args.removeinds:
 		mhFile.removeInds(input.args.removeinds) # remove blacklisted individuals (if invoked)
-	mhFile.runFilters() # run missing data filters
+
+	# threshold sweep mode reports filter outcomes for grids of thresholds and stops before filtering or conversion
+	if input.args.sweep:
+		mhFile.sweepThresholds(input.args.sweepind, input.args.sweeploc, pops)
+		return
+
+	mhFile.runFilters(pops) # run missing data filters
 
 	# calculate ending stats after running all filters
 	mLocEnd = mhFile.calcMissingLocPCT()
@@ -103,7 +109,7 @@ def main():
 	# conversion process
 	if not input.args.genoerrfile:
 		input.args.genoerrfile = 'None' # insert dummy value to feed if individual marker rates 
-	conversion = MHconvert(mhFile.df, input.args.infile, locusdict, colonyData, input.args.droperr, input.args.genoerr, input.args.pmale, input.args.pfemale, input.args.runname, input.args.inbreed, input.args.runlength, convertedDir, alleleFreqs, snppitCols, pops, input.args.snppitmap, snpDict, input.args.genoerrfile)
+	conversion = MHconvert(mhFile.df, input.args.infile, locusdict, colonyData, input.args.droperr, input.args.genoerr, input.args.pmale, input.args.pfemale, input.args.runname, input.args.inbreed, input.args.runlength, convertedDir, alleleFreqs, snppitCols, pops, input.args.snppitmap, snpDict, input.args.genoerrfile, mhFile.getGenotypes(), input.args.convthreads, input.args.snpcoords)
 	conversion.convert(convDict)
 
 	# print starting and ending individuals per population
@@ -128,6 +134,7 @@ def main():
 			fh.write("\n")
 			
 
-main()
+if __name__ == "__main__":
+	main()
 
-raise SystemExit
+	raise SystemExit
@@ -0,0 +1,195 @@
+import math
+import multiprocessing
+import numpy
+import os
+import tempfile
+
+# read-only views of the memory-mapped genotype matrix in each worker process
+workerOnehot = None
+workerValid = None
+
+def initWorker(onehotFile, validFile):
+	global workerOnehot, workerValid
+	workerOnehot = numpy.load(onehotFile, mmap_mode='r')
+	workerValid = numpy.load(validFile, mmap_mode='r')
+
+def countTile(args):
+	# count mismatches for a single tile (rows rs:rstop vs rows cs:cstop) of the upper triangle
+	rs, rstop, cs, cstop, thresh = args
+	shared = workerValid[rs:rstop] @ workerValid[cs:cstop].T
+	matches = workerOnehot[rs:rstop] @ workerOnehot[cs:cstop].T
+	counts = (shared - matches).astype(numpy.int64)
+	hits = counts <= thresh
+	if rs == cs:
+		hits &= numpy.triu(numpy.ones(hits.shape, dtype=bool), k=1) # diagonal tile; keep j > i
+	i, j = numpy.nonzero(hits)
+	return i + rs, j + cs, counts[i, j]
+
+def expand(codes, widths=None):
+	# one indicator column per allele per genotype column. The dot product of two rows of 'onehot'
+	# counts matching non-missing alleles; the dot product of two rows of 'valid' counts columns
+	# where both rows have data. The difference between the two is the number of mismatches.
+	# 'widths' (number of alleles per column) must be shared when comparing separately encoded matrices.
+	nRows, nCols = codes.shape
+	if widths is None:
+		widths = codes.max(axis=0, initial=-1) + 1 # number of alleles observed per column
+	widths = numpy.asarray(widths, dtype=numpy.int64)
+	offsets = numpy.concatenate(([0], numpy.cumsum(widths)[:-1])).astype(numpy.int64)
+
+	onehot = numpy.zeros((nRows, int(widths.sum())), dtype=numpy.float32)
+	rows, cols = numpy.nonzero(codes >= 0)
+	onehot[rows, offsets[cols] + codes[rows, cols]] = 1.0
+
+	valid = (codes >= 0).astype(numpy.float32)
+
+	return onehot, valid
+
+class Mismatch():
+	'Class for counting pairwise allelic mismatches between rows of a genotype matrix'
+
+	def __init__(self, codes, block=1024):
+		self.block = block # number of rows compared against the rest of the matrix at a time
+		self.codes = codes # integer-encoded genotypes; -1 = missing data
+		self.onehot = None # per-allele indicator matrix; only built for all-pairs comparisons
+		self.valid = None # indicator matrix of non-missing genotypes
+
+	def countBlock(self, start, stop, jstart=0, jstop=None):
+		# mismatch counts for rows start:stop against rows jstart:jstop
+		# float32 sums of 0/1 values are exact well beyond any realistic number of loci
+		if jstop is None:
+			jstop = len(self.codes)
+		shared = self.valid[start:stop] @ self.valid[jstart:jstop].T
+		matches = self.onehot[start:stop] @ self.onehot[jstart:jstop].T
+		return (shared - matches).astype(numpy.int64)
+
+	def findPairs(self, thresh, threads=1):
+		# return row indexes (i < j) and mismatch counts for all pairs with <= thresh mismatches
+		# pairs are returned in the same order as itertools.combinations(range(n), 2)
+		if self.onehot is None:
+			self.onehot, self.valid = expand(self.codes)
+
+		if threads > 1:
+			return self.findPairsParallel(thresh, threads)
+
+		firstList = list()
+		secondList = list()
+		countList = list()
+		nRows = len(self.codes)
+		for start in range(0, nRows, self.block):
+			stop = min(start + self.block, nRows)
+			counts = self.countBlock(start, stop, start) # only compare against rows at or below the block
+			hits = counts <= thresh
+			hits &= numpy.triu(numpy.ones(hits.shape, dtype=bool), k=1) # keep upper triangle (j > i)
+			i, j = numpy.nonzero(hits)
+			firstList.append(i + start)
+			secondList.append(j + start)
+			countList.append(counts[i, j])
+
+		if not firstList:
+			empty = numpy.empty(0, dtype=numpy.int64)
+			return empty, empty, empty
+
+		return numpy.concatenate(firstList), numpy.concatenate(secondList), numpy.concatenate(countList)
+
+	def countPairs(self, first, second, chunk=10000):
+		# exact mismatch counts for an explicit list of row pairs, compared directly on the integer codes
+		counts = numpy.empty(len(first), dtype=numpy.int64)
+		for start in range(0, len(first), chunk):
+			a = self.codes[first[start:start+chunk]]
+			b = self.codes[second[start:start+chunk]]
+			counts[start:start+chunk] = ((a != b) & (a >= 0) & (b >= 0)).sum(axis=1)
+		return counts
+
+	def compareRows(self, rows, others, thresh, cells=1 << 22):
+		# exact mismatch counts of every row in 'rows' against every row in 'others'; returns pairs (i < j) with
+		# <= thresh mismatches. Rows are compared in blocks of about 'cells' pair counts at a time.
+		if self.onehot is None:
+			self.onehot, self.valid = expand(self.codes)
+		rows = numpy.asarray(rows, dtype=numpy.int64)
+		others = numpy.asarray(others, dtype=numpy.int64)
+		otherOnehot = self.onehot[others]
+		otherValid = self.valid[others]
+		step = max(1, cells // max(len(others), 1))
+
+		firstList = list()
+		secondList = list()
+		countList = list()
+		for start in range(0, len(rows), step):
+			block = rows[start:start+step]
+			shared = self.valid[block] @ otherValid.T
+			matches = self.onehot[block] @ otherOnehot.T
+			counts = (shared - matches).astype(numpy.int64)
+			i, j = numpy.nonzero(counts <= thresh)
+			a, b = block[i], others[j]
+			keep = a != b # a row is never a duplicate of itself
+			firstList.append(numpy.minimum(a, b)[keep])
+			secondList.append(numpy.maximum(a, b)[keep])
+			countList.append(counts[i, j][keep])
+
+		if not firstList:
+			empty = numpy.empty(0, dtype=numpy.int64)
+			return empty, empty, empty
+
+		return numpy.concatenate(firstList), numpy.concatenate(secondList), numpy.concatenate(countList)
+
+	def makeTiles(self, threads):
+		# split the upper triangle of the pair matrix into square tiles of equal size
+		# aim for several tiles per worker so that the last tiles do not leave workers idle
+		nRows = len(self.codes)
+		nBlocks = math.ceil(math.sqrt(8 * threads))
+		size = max(64, min(self.block, math.ceil(nRows / nBlocks)))
+		starts = list(range(0, nRows, size))
+
+		tiles = list()
+		for bi, rs in enumerate(starts):
+			for cs in starts[bi:]:
+				tiles.append((rs, min(rs + size, nRows), cs, min(cs + size, nRows)))
+
+		return tiles
+
+	def findPairsParallel(self, thresh, threads):
+		tiles = self.makeTiles(threads)
+		print(f"Comparing {len(tiles)} tiles of the pairwise matrix using {threads} processes.")
+
+		firstList = list()
+		secondList = list()
+		countList = list()
+
+		# write the encoded matrix to disk once; workers memory-map it read-only so it is shared through the page cache
+		with tempfile.TemporaryDirectory() as tmpdir:
+			onehotFile = os.path.join(tmpdir, "onehot.npy")
+			validFile = os.path.join(tmpdir, "valid.npy")
+			numpy.save(onehotFile, self.onehot)
+			numpy.save(validFile, self.valid)
+
+			# limit each worker to a single BLAS thread so that workers do not compete for cores
+			blasVars = ['OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS']
+			oldEnv = {var: os.environ.get(var) for var in blasVars}
+			for var in blasVars:
+				os.environ[var] = "1"
+			try:
+				ctx = multiprocessing.get_context("spawn")
+				with ctx.Pool(threads, initializer=initWorker, initargs=(onehotFile, validFile)) as pool:
+					for i, j, counts in pool.imap_unordered(countTile, [tile + (thresh,) for tile in tiles]):
+						firstList.append(i)
+						secondList.append(j)
+						countList.append(counts)
+			finally:
+				for var, val in oldEnv.items():
+					if val is None:
+						os.environ.pop(var, None)
+					else:
+						os.environ[var] = val
+
+		if not firstList:
+			empty = numpy.empty(0, dtype=numpy.int64)
+			return empty, empty, empty
+
+		first = numpy.concatenate(firstList)
+		second = numpy.concatenate(secondList)
+		counts = numpy.concatenate(countList)
+
+		# merge tiles back into row-major pair order
+		order = numpy.lexsort((second, first))
+
+		return first[order], second[order], counts[order]
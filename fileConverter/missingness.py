@@ -0,0 +1,54 @@
+import numpy
+import pandas
+
+class Missingness():
+	'Class for tracking missing genotype calls per individual and per allele column as individuals and loci are removed'
+
+	def __init__(self, geno):
+		self.inds = geno.inds # individuals that are still in the dataset
+		self.columns = geno.columns() # all allele columns; position = bit in the packed matrix
+		self.keepCols = numpy.ones(len(self.columns), dtype=bool) # allele columns that are still in the dataset
+		self.colIndex = {col: j for j, col in enumerate(self.columns)}
+
+		# null mask computed once and stored with 8 allele columns per byte
+		mask = geno.codes.reshape(len(self.inds), -1) < 0
+		self.packed = numpy.packbits(mask, axis=1)
+		self.rowMissing = mask.sum(axis=1).astype(numpy.int64) # missing calls per individual over remaining columns
+		self.colMissing = mask.sum(axis=0).astype(numpy.int64) # missing calls per column over remaining individuals
+
+	def bits(self, rows, cols):
+		# unpack the mask for the given rows and allele columns
+		cols = numpy.asarray(cols, dtype=numpy.int64)
+		return (self.packed[rows][:, cols // 8] >> (7 - cols % 8)) & 1
+
+	def dropInds(self, names):
+		keep = ~self.inds.isin(names)
+		if not keep.all():
+			removed = self.bits(~keep, numpy.flatnonzero(self.keepCols))
+			self.colMissing[self.keepCols] -= removed.sum(axis=0, dtype=numpy.int64)
+			self.inds = self.inds[keep]
+			self.packed = self.packed[keep]
+			self.rowMissing = self.rowMissing[keep]
+
+	def dropColumns(self, cols):
+		idx = [self.colIndex[col] for col in cols if self.keepCols[self.colIndex[col]]]
+		if idx:
+			removed = self.bits(slice(None), idx)
+			self.rowMissing -= removed.sum(axis=1, dtype=numpy.int64)
+			self.keepCols[idx] = False
+
+	def keptColumns(self):
+		return [self.columns[j] for j in numpy.flatnonzero(self.keepCols)]
+
+	def matrix(self):
+		# unpacked null mask of the remaining individuals and allele columns
+		return self.bits(slice(None), numpy.flatnonzero(self.keepCols)).astype(bool)
+
+	def locPCT(self):
+		# proportion of missing data per remaining allele column
+		cols = numpy.flatnonzero(self.keepCols)
+		return pandas.Series(self.colMissing[cols] / len(self.inds), index=[self.columns[j] for j in cols])
+
+	def indPCT(self):
+		# proportion of missing data per remaining individual
+		return pandas.Series(self.rowMissing / int(self.keepCols.sum()), index=self.inds)
@@ -0,0 +1,63 @@
+import numpy
+import pandas
+
+class PopFilter():
+	'Class for summarizing missing data and alleles per locus within each population in one grouped pass'
+
+	def __init__(self, geno, missing, pops):
+		self.geno = geno # Genotypes object for the remaining individuals and loci
+		self.missing = missing # Missingness object for the remaining individuals and allele columns
+
+		# sort individuals by population once; every population is then one contiguous block of rows
+		popNames, popIds = numpy.unique([str(pops[name]) for name in self.geno.inds], return_inverse=True)
+		self.order = numpy.argsort(popIds, kind='stable')
+		self.starts = numpy.searchsorted(popIds[self.order], numpy.arange(len(popNames)))
+		self.popNames = popNames.tolist()
+		self.popSizes = numpy.bincount(popIds, minlength=len(popNames))
+		self.popIds = popIds
+
+	def missingByPop(self):
+		# proportion of missing data per population (rows) and remaining allele column (columns)
+		mask = self.missing.matrix()[self.order]
+		counts = numpy.add.reduceat(mask.astype(numpy.int64), self.starts, axis=0) if len(mask) else numpy.zeros((0, mask.shape[1]), dtype=numpy.int64)
+		return pandas.DataFrame(counts / self.popSizes[:, None], index=self.popNames, columns=self.missing.keptColumns())
+
+	def presence(self):
+		# which alleles occur in each population (rows); the alleles of locus k are columns offsets[k] to offsets[k+1]
+		sizes = [len(alleles) for alleles in self.geno.alleles]
+		offsets = numpy.concatenate(([0], numpy.cumsum(sizes))).astype(numpy.int64)
+		nFlat = int(offsets[-1])
+
+		# one bincount over (population, locus, allele) ids counts every allele of every population
+		codes = self.geno.codes
+		ids = codes + offsets[:-1][None, :, None] + (self.popIds * nFlat)[:, None, None]
+		ids = ids[codes >= 0]
+		present = (numpy.bincount(ids, minlength=len(self.popNames) * nFlat) > 0).reshape(len(self.popNames), nFlat)
+		return present, offsets
+
+	def countDistinct(self, present, offsets):
+		# sum presence over the alleles of each locus; loci without any alleles have no slots to sum
+		sizes = numpy.diff(offsets)
+		distinct = numpy.zeros((len(present), len(sizes)), dtype=numpy.int64)
+		nonEmpty = numpy.flatnonzero(sizes > 0)
+		if offsets[-1] > 0:
+			distinct[:, nonEmpty] = numpy.add.reduceat(present.astype(numpy.int64), offsets[nonEmpty], axis=1)
+		return distinct
+
+	def allelesByPop(self):
+		# number of distinct alleles per population (rows) and remaining locus (columns)
+		present, offsets = self.presence()
+		return pandas.DataFrame(self.countDistinct(present, offsets), index=self.popNames, columns=self.geno.loci)
+
+	def maxMissing(self):
+		# highest proportion of missing data of each locus in any population, and the population it occurs in
+		byPop = self.missingByPop()
+		byLocus = byPop.T.groupby(lambda col: col[:-2], sort=False).max().T # worst allele column of each locus
+		return pandas.DataFrame({"Population": byLocus.idxmax(axis=0), "Missing": byLocus.max(axis=0)})
+
+	def monomorphic(self):
+		# loci with at most one allele within every population and the same allele in all populations with calls;
+		# loci fixed for different alleles in different populations are kept
+		present, offsets = self.presence()
+		overall = self.countDistinct(present.any(axis=0, keepdims=True), offsets)[0] # alleles seen in any population
+		return [locus for locus, n in zip(self.geno.loci, overall) if n <= 1]
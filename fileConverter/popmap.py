@@ -4,7 +4,7 @@ class Popmap():
 	'Class for parsing popmap data from a pandas dataframe'
 
 	def __init__(self, popmap):
-		self.pops = popmap
+		self.pops = dict(popmap) # copy; normalizing population names must not change the caller's dict
 
 	def parseMap(self):
 		mapDict = dict()
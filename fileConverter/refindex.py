@@ -0,0 +1,122 @@
+import numpy
+import os
+
+from mismatch import expand
+
+class RefIndex():
+	'Class for a persistent on-disk index of encoded genotypes from previously processed runs'
+
+	def __init__(self, path, source, block=4096):
+		self.path = path # .npz file holding the index
+		self.source = source # name of the input file whose samples are added to the index
+		self.block = block # number of reference rows compared at a time
+
+		self.samples = list() # sample names
+		self.sources = list() # input file each sample came from
+		self.columns = list() # genotype column names
+		self.tables = list() # per column dict of allele string -> integer code
+		self.codes = numpy.empty((0, 0), dtype=numpy.int16) # integer-encoded genotypes; -1 = missing data
+
+		if os.path.isfile(self.path):
+			self.load()
+			print(f"Loaded reference index {self.path} containing {len(self.samples)} samples from {len(set(self.sources))} runs.")
+		else:
+			print(f"Reference index {self.path} does not exist yet. It will be created from this run.")
+
+	def load(self):
+		with numpy.load(self.path) as data:
+			self.samples = data['samples'].tolist()
+			self.sources = data['sources'].tolist()
+			self.columns = data['columns'].tolist()
+			self.codes = data['codes']
+			# alleles are stored in code order, so position within each column is the code
+			self.tables = [dict() for col in self.columns]
+			for allele, col in zip(data['alleles'].tolist(), data['alleleCols'].tolist()):
+				table = self.tables[col]
+				table[allele] = len(table)
+
+	def save(self):
+		alleles = list()
+		alleleCols = list()
+		for col, table in enumerate(self.tables):
+			alleles.extend(table.keys()) # dicts preserve insertion (code) order
+			alleleCols.extend([col] * len(table))
+
+		# write to a temporary file first so an interrupted run cannot corrupt the index
+		tmp = self.path + ".tmp.npz"
+		numpy.savez(tmp,
+			samples=numpy.array(self.samples, dtype=str),
+			sources=numpy.array(self.sources, dtype=str),
+			columns=numpy.array(self.columns, dtype=str),
+			codes=self.codes,
+			alleles=numpy.array(alleles, dtype=str),
+			alleleCols=numpy.array(alleleCols, dtype=numpy.int32))
+		os.replace(tmp, self.path)
+
+	def encode(self, geno):
+		# encode canonical genotypes with the allele codes of the index, adding new columns and alleles as needed
+		columns = geno.columns()
+		colIdx = {col: i for i, col in enumerate(self.columns)}
+		for col in columns:
+			if col not in colIdx:
+				colIdx[col] = len(self.columns)
+				self.columns.append(col)
+				self.tables.append(dict())
+
+		# reference samples are missing data for columns that were not present in earlier runs
+		pad = len(self.columns) - self.codes.shape[1]
+		if pad:
+			self.codes = numpy.pad(self.codes, ((0, 0), (0, pad)), constant_values=-1)
+
+		pairs = geno.canonical()
+		codes = numpy.full((len(pairs), len(self.columns)), -1, dtype=numpy.int16)
+		for i, col in enumerate(columns):
+			# translate this run's allele codes for the locus into index allele codes
+			table = self.tables[colIdx[col]]
+			mapped = numpy.array([table.setdefault(allele, len(table)) for allele in geno.alleles[i // 2]] + [-1], dtype=numpy.int16)
+			codes[:, colIdx[col]] = mapped[pairs[:, i]] # code -1 selects the trailing missing value
+
+		return codes
+
+	def findPairs(self, codes, names, thresh):
+		# compare new samples against all reference samples; returns (reference name, reference run, new name, mismatches)
+		# reference samples added by an earlier run of the same input file are skipped; samples from other runs
+		# are compared even if they have the same name as a new sample
+		refRows = numpy.array([i for i, source in enumerate(self.sources) if source != self.source], dtype=numpy.int64)
+
+		widths = [len(table) for table in self.tables]
+		onehot, valid = expand(codes, widths)
+
+		newList = list()
+		refList = list()
+		countList = list()
+		for start in range(0, len(refRows), self.block):
+			rows = refRows[start:start+self.block]
+			refOnehot, refValid = expand(self.codes[rows], widths)
+			counts = (valid @ refValid.T - onehot @ refOnehot.T).astype(numpy.int64)
+			i, j = numpy.nonzero(counts <= thresh)
+			newList.append(i)
+			refList.append(rows[j])
+			countList.append(counts[i, j])
+
+		pairs = list()
+		if newList:
+			newIdx = numpy.concatenate(newList)
+			refIdx = numpy.concatenate(refList)
+			counts = numpy.concatenate(countList)
+			for k in numpy.lexsort((refIdx, newIdx)):
+				pairs.append((self.samples[refIdx[k]], self.sources[refIdx[k]], newIdx[k], int(counts[k])))
+
+		return pairs
+
+	def append(self, codes, names):
+		# replace the samples added by an earlier run of the same input file and append the new samples
+		names = list(names)
+		keep = [i for i, source in enumerate(self.sources) if source != self.source]
+
+		self.samples = [self.samples[i] for i in keep] + names
+		self.sources = [self.sources[i] for i in keep] + [self.source] * len(names)
+		self.codes = numpy.concatenate((self.codes[keep], codes), axis=0)
+
+		self.save()
+		print(f"Added {len(names)} samples to reference index {self.path} ({len(self.samples)} samples total).")
@@ -1,103 +1,89 @@
+from delimited import lookupBlocks
+
 import collections
+import numpy
 import os
 import pandas
 
-from majmin import MajMin
-
 class Sequoia():
-	'Class for converting pandas dataframe to sequoia format'
+	'Class for converting SNP genotypes to sequoia format'
 
-	def __init__(self, df, convDir):
-		self.pdf = df
-		mm = MajMin(self.pdf, 0, 1, 2)
-		self.recode12 = mm.getMajorMinor() #stores major/minor allele for converting to binary format. 2 = missing, 0 = major, 1 = minor
+	def __init__(self, snps, convDir, recode12):
+		self.snps = snps # SNPMatrix object with integer SNP genotype codes
+		self.recode12 = recode12 #stores major/minor allele for converting to binary format. 2 = missing, 0 = major, 1 = minor
 		self.genotypes = {'00': '0', '11': '2', '10': '1', '01': '1', '22': '-9'} # map for converting binary format to sequoia format
 		self.convertedDir = convDir
 
 	def convert(self, snppit):
-		output = list()
-
-		output = self.makeSequoia(output, snppit)
+		# returns a generator of output lines
+		output = self.makeSequoia(snppit)
 		
 		return output
 
-	def makeSequoia(self, output, snppit):
+	def makeSequoia(self, snppit):
 		#print(snppit) #uncomment to print SNPPIT columns to stdout
-		# open sequoia life history file for writing
+		names = self.snps.inds.tolist()
+
+		# write life history file from one join of the SNPPIT columns against all samples
+		lh = self.makeLH(names, snppit)
 		popmapOut = os.path.join(self.convertedDir, "sequoia.LH.txt")
-		fh=open(popmapOut, 'w')
+		with open(popmapOut, 'w') as fh:
+			fh.write(''.join([line + "\n" for line in lh]))
 
-		for sampleName, row in self.pdf.iterrows():
-			lineList = list()
+		# dosage (0/1/2/-9) of every distinct genotype per locus; checked before any genotypes are written
+		tables = self.makeDosage()
 
-			# write relevant data to life history file
-			fh.write(sampleName)
-			fh.write("\t")
-			try:
-				tempSex = str(snppit.loc[sampleName]['POPCOLUMN_SEX'])
-			except KeyError as e:
-				print("ERROR: " + str(e) + " not found.")
-				print("Your input .xlsx file might be missing the POPCOLUMN_SEX column. This is required for Sequoia format conversion.")
-				print("Exiting Program...")
-				print("")
-				print("")
-				raise SystemExit
+		return self.lines(tables)
 
-			if tempSex.casefold() == "m" or tempSex.casefold() == "male":
-				fh.write("2") # need to convert sex data to sequoia format (1 = female, 2 = male, 3 = unknown)
-			elif tempSex.casefold() == "f" or tempSex.casefold() == "female":
-				fh.write("1") # need to convert sex data to sequoia format (1 = female, 2 = male, 3 = unknown)
-			else:
-				fh.write("3") # need to convert sex data to sequoia format (1 = female, 2 = male, 3 = unknown)
-			fh.write("\t")
+	def lines(self, tables):
+		# dosage matrix, rendered a block of samples at a time
+		for positions, names, cells in lookupBlocks(self.snps.inds, self.snps.codes, tables, numpy.arange(len(self.snps.inds))):
+			for sampleName, row in zip(names, cells.tolist()):
+				yield "\t".join([sampleName] + row)
 
-			try:
-				if snppit.isnull().loc[sampleName]["OFFSPRINGCOLUMN_BORN_YEAR"] is False:
-					fh.write("-1")
-				else: 
-					fh.write(str(snppit.loc[sampleName]["OFFSPRINGCOLUMN_BORN_YEAR"])) # might need to pull birth year data from special column. Negative number = unknown
-				fh.write("\n")
-			except KeyError as e:
-				print("ERROR: " + str(e) + " not found.")
-				print("Your input .xlsx file might be missing the OFFSPRINGCOLUMN_BORN_YEAR column. This is required for Sequoia format conversion.")
+	def makeLH(self, names, snppit):
+		# returns one line per sample: name, sex (1 = female, 2 = male, 3 = unknown) and birth year
+		for col in ['POPCOLUMN_SEX', 'OFFSPRINGCOLUMN_BORN_YEAR']:
+			if col not in snppit.columns:
+				print("ERROR: '" + col + "' not found.")
+				print("Your input .xlsx file might be missing the " + col + " column. This is required for Sequoia format conversion.")
 				print("Exiting Program...")
 				print("")
 				print("")
 				raise SystemExit
-				
-			lineList.append(sampleName)
-			
-			for (locus, genotype) in row.items():
+
+		lhData = pandas.DataFrame(index=self.snps.inds).join(snppit[['POPCOLUMN_SEX', 'OFFSPRINGCOLUMN_BORN_YEAR']], how='left')
+		sexCodes = {"m": "2", "male": "2", "f": "1", "female": "1"}
+		sex = [sexCodes.get(str(val).casefold(), "3") for val in lhData['POPCOLUMN_SEX'].to_numpy(dtype=object)]
+		born = [str(val) for val in lhData['OFFSPRINGCOLUMN_BORN_YEAR'].to_numpy(dtype=object)] # missing years are written as-is
+
+		return [name + "\t" + s + "\t" + b for name, s, b in zip(names, sex, born)]
+
+	def makeDosage(self):
+		# every distinct genotype of a locus is translated once through the major/minor table;
+		# returns one array of dosages per locus (position = genotype code)
+		tables = list()
+		for j, locus in enumerate(self.snps.loci):
+			table = numpy.empty(len(self.snps.genotypes[j]) + 1, dtype=object)
+			for code in pandas.unique(self.snps.codes[:, j]):
+				genotype = self.snps.genotypes[j][code]
 				alleles = self.split(str(genotype))
-				tempList = list()
-				
-				# next line is testing for original data missing value (0) instead of binary recoded missing value (2). 
+				# next line is testing for original data missing value (0) instead of binary recoded missing value (2).
 				if len(alleles) == 1 and alleles[0] == "0":
-					tempList.append(self.recode12[locus][alleles[0]])
-					tempList.append(self.recode12[locus][alleles[0]])
-				else:
-					for allele in alleles:
-						tempList.append(self.recode12[locus][allele])
-				tempString = ''.join(tempList)
+					alleles = alleles * 2
+				tempString = ''.join([self.recode12[locus][allele] for allele in alleles])
 				try:
-					tempString = self.genotypes[tempString]
+					table[code] = self.genotypes[tempString]
 				except KeyError as e:
-					print("Problem converting locus" + locus + "for individual" + sampleName + "to create Sequoia output.")
-					print("Problem key when accessing recoded allele hash:" + e)
+					print("Problem converting genotype " + str(genotype) + " at locus " + locus + " to create Sequoia output.")
+					print("Problem key when accessing recoded allele hash: " + str(e))
 					print("Exiting program...")
 					print("")
 					print("")
 					raise SystemExit
-				lineList.append(tempString)
-
-			lineString = "\t".join(lineList)
+			tables.append(table)
 
-			output.append(lineString)
-
-		# close sequoia life history file
-		fh.close()
-
-		return output
+		return tables
 	
 	def split(self, word):
 		return [char for char in word]	
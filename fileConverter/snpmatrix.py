@@ -0,0 +1,42 @@
+import numpy
+
+class SNPMatrix():
+	'Class for holding diploid SNP genotypes extracted from microhap allele codes as a compact integer matrix'
+
+	def __init__(self, geno, kd):
+		self.inds = geno.inds # individual names
+		self.loci = list(kd.keys()) # loci with a retained SNP position
+		locusIndex = {locus: k for k, locus in enumerate(geno.loci)}
+		sel = numpy.array([locusIndex[locus] for locus in self.loci], dtype=numpy.int64)
+
+		# code point of the retained SNP in every allele of every selected locus, in one flat array
+		# (0 = allele too short to contain the position)
+		chars = list()
+		sizes = list()
+		for locus, k in zip(self.loci, sel):
+			pos = kd[locus]
+			chars.extend([ord(allele[pos]) if len(allele) > pos else 0 for allele in geno.alleles[k]])
+			sizes.append(len(geno.alleles[k]))
+		chars = numpy.array(chars, dtype=numpy.int64)
+		offsets = numpy.concatenate(([0], numpy.cumsum(sizes)[:-1])).astype(numpy.int64)
+
+		# SNP alleles of all individuals and loci at once; canonical genotypes hold -1 first if any allele is missing
+		pairs = geno.pairs[:, sel, :]
+		missing = pairs[:, :, 0] < 0
+		snps = chars[numpy.where(pairs >= 0, pairs + offsets[:, None], 0)] if len(chars) else numpy.zeros(pairs.shape, dtype=numpy.int64)
+		snps.sort(axis=2) # sorted diploid genotype
+		keys = snps[:, :, 0] * 0x110000 + snps[:, :, 1] # one integer per genotype
+		keys[missing] = -1
+
+		# per locus table of genotype strings ("0" = missing data); codes index into the table
+		self.codes = numpy.empty(keys.shape, dtype=numpy.int16)
+		self.genotypes = list()
+		for j in range(len(self.loci)):
+			uniq, inverse = numpy.unique(keys[:, j], return_inverse=True)
+			self.codes[:, j] = inverse
+			self.genotypes.append(numpy.array([self.toString(key) for key in uniq], dtype=object))
+
+	def toString(self, key):
+		if key < 0:
+			return "0"
+		return ''.join([chr(c) for c in divmod(int(key), 0x110000) if c > 0])
@@ -1,12 +1,14 @@
+from delimited import lookupBlocks
 from popmap import Popmap
 
+import numpy
 import pandas
 
 class Snppit():
-	'Class for converting pandas dataframe to snppit format'
+	'Class for converting SNP genotypes to snppit format'
 
-	def __init__(self, df, popmap):
-		self.pdf = df
+	def __init__(self, snps, popmap):
+		self.snps = snps # SNPMatrix object with integer SNP genotype codes
 		self.pops = popmap
 		self.nucleotides = {'A': '101', 'C': '102', 'G': '103', 'T': '104', '-': '105', '0': '-9'}
 
@@ -56,7 +58,7 @@ class Snppit():
 						print("")
 						raise SystemExit
 	
-	def printData(self, mapDict, lineList, poplist, status, optCols, snppitdf):
+	def printData(self, mapDict, poplist, status, groups, optData, tables):
 		for (pop, num) in mapDict.items():
 			if pop in poplist:
 				templist = list()
@@ -66,80 +68,77 @@ class Snppit():
 				else:
 					templist = [status, pop]
 				popstring = ' '.join(templist)
-				lineList.append(popstring)
+				yield popstring
 
 				#print data for population
-				for sampleName, row in self.pdf.iterrows():
-					sampleList = list()
-					if self.pops[sampleName] == pop:
-						#append sample name
-						sampleList.append(sampleName)
-
-						#check if optional columns were used, append values if they exist
-						if optCols:
-							for opt in optCols:
-								# handle cells with missing data
-								if pandas.isnull(snppitdf.loc[sampleName][opt]):
-									sampleList.append("?") #if no data, append "?" to sampleList
-								# handle cells containing year data
-								elif "YEAR" in opt:
-									#print(opt + " contains YEAR.")
-									try:
-										sampleList.append(str(int(snppitdf.loc[sampleName][opt])))
-									except ValueError as e:
-										print("CONVERSION NOT SUCCESSFUL")
-										print("Invalid year input detected: " + str(e) + ".")
-										print("All data in the " + opt + " column should be valid 4-digit years.")
-										print("Leave blank cells in " + opt + " if you have unknown or missing data.")
-										print("")
-										raise SystemExit
-								# handle sex data. m/male and f/female are valid values, and are accepted as case insensitive. All other values result in "?"
-								elif opt == "POPCOLUMN_SEX":
-									val = snppitdf.loc[sampleName][opt]
-									if val.casefold() == "m" or val.casefold() == "male":
-										sampleList.append("M")
-									elif val.casefold() == "f" or val.casefold() == "female":
-										sampleList.append("F")
-									else:
-										sampleList.append("?")
-								# print all other data in optional SNPPIT columns as-is. Additional data validation might be necessary here in the future. 
-								else:
-									sampleList.append(str(snppitdf.loc[sampleName][opt]))
-						# handle data for each locus
-						for (locus, genotype) in row.items():
-							alleles = self.split(str(genotype))
-							locusList = list()
-
-							if len(alleles) == 1 and alleles[0] == '0':
-								locusList.append(self.nucleotides[alleles[0]])
-								locusList.append(self.nucleotides[alleles[0]])
-							else:
-								for allele in alleles:
-									try:
-										locusList.append(self.nucleotides[allele])
-									except KeyError as e:
-										print("CONVERSION NOT SUCCESSFUL")
-										print("ERROR in converting alleles. The following allele was found in your input file:")
-										print(str(e))
-										print("Did you remember to remove sex-linked markers?")
-										print("")
-										raise SystemExit
-
-							locusStr = ' '.join(locusList)
-							sampleList.append(locusStr)
-						sampleStr = '\t'.join(sampleList)
-						lineList.append(sampleStr)
-	
+				yield from self.renderRows(groups.get(pop, list()), optData, tables)
+
+	def renderRows(self, rows, optData, tables):
+		# translate genotype codes with the per-locus tables; optData holds pre-formatted optional columns per sample
+		for positions, names, cells in lookupBlocks(self.snps.inds, self.snps.codes, tables, numpy.asarray(rows, dtype=numpy.int64)):
+			for i, sampleName, row in zip(positions, names, cells.tolist()):
+				yield '\t'.join([sampleName] + optData[i] + row)
+
+	def formatOptional(self, names, optCols, snppitdf):
+		# format optional SNPPIT columns for the given samples; returns one list of values per sample
+		# and a list of (sample, column, value) for cells that do not contain a valid year
+		formatted = [list() for name in names]
+		invalid = list()
+		for opt in optCols:
+			values = snppitdf[opt].reindex(names).to_numpy(dtype=object)
+			for i, val in enumerate(values):
+				# handle cells with missing data
+				if pandas.isnull(val):
+					formatted[i].append("?") #if no data, append "?"
+				# handle cells containing year data
+				elif "YEAR" in opt:
+					try:
+						formatted[i].append(str(int(val)))
+					except ValueError:
+						invalid.append((names[i], opt, val))
+				# handle sex data. m/male and f/female are valid values, and are accepted as case insensitive. All other values result in "?"
+				elif opt == "POPCOLUMN_SEX":
+					sex = str(val).casefold()
+					if sex == "m" or sex == "male":
+						formatted[i].append("M")
+					elif sex == "f" or sex == "female":
+						formatted[i].append("F")
+					else:
+						formatted[i].append("?")
+				# print all other data in optional SNPPIT columns as-is. Additional data validation might be necessary here in the future.
+				else:
+					formatted[i].append(str(val))
+		return formatted, invalid
+
+	def encodeGenotypes(self, rows):
+		# translate every distinct SNP genotype of each locus among the given rows into a pair of numeric allele codes.
+		# Returns one array of locus strings per locus (position = genotype code) and the set of unexpected alleles
+		tables = list()
+		unexpected = set()
+		rows = numpy.asarray(rows, dtype=numpy.int64)
+		for j, genotypes in enumerate(self.snps.genotypes):
+			table = numpy.empty(len(genotypes) + 1, dtype=object) # genotypes that do not occur among the rows are never selected
+			for code in pandas.unique(self.snps.codes[rows, j]):
+				alleles = self.split(str(genotypes[code]))
+				if len(alleles) == 1 and alleles[0] == '0':
+					table[code] = ' '.join([self.nucleotides['0'], self.nucleotides['0']])
+				else:
+					unexpected.update([allele for allele in alleles if allele not in self.nucleotides])
+					table[code] = ' '.join([self.nucleotides.get(allele, '') for allele in alleles])
+			tables.append(table)
+		return tables, unexpected
+
 	def convert(self, snppitmap, snppitCols):
 		self.parseSnppitMap(snppitmap)
 		pm = Popmap(self.pops)
 		mapDict = pm.parseMap()
+		pops = pm.pops # population names normalized by parseMap
 
-		#make list to hold all lines that will be printed to file
+		#make list to hold header lines; sample lines are generated as they are written
 		lineList = list()
 
 		#append header lines to list
-		nLoci = len(self.pdf.axes[1]) #calculate number of loci
+		nLoci = len(self.snps.loci) #calculate number of loci
 		numlociList = ["NUMLOCI", str(nLoci)]
 		numloci = ' '.join(numlociList)
 		lineList.append(numloci)
@@ -163,16 +162,55 @@ class Snppit():
 						offCols.append(col)
 
 		#locus genotyping error values
-		for (columnName, columnData) in self.pdf.items():
+		for columnName in self.snps.loci:
 			templist = [columnName, "0.005"]
 			locuserr = '\t'.join(templist)
 			lineList.append(locuserr)
 
-		#need to print all POP before all OFFSPRING
-		self.printData(mapDict, lineList, self.POP, "POP", popCols, snppitCols)
-		self.printData(mapDict, lineList, self.OFFSPRING, "OFFSPRING", offCols, snppitCols)
+		# group samples by population once, keeping input order within each population
+		names = self.snps.inds.tolist()
+		groups = dict()
+		for i, sampleName in enumerate(names):
+			groups.setdefault(pops[sampleName], list()).append(i)
 
-		return lineList
+		# validate all samples that will be written before writing anything, so that all errors are reported together
+		popRows = [i for pop in self.POP for i in groups.get(pop, list())]
+		offRows = [i for pop in self.OFFSPRING for i in groups.get(pop, list())]
+		popOpt, popInvalid = self.formatOptional([names[i] for i in popRows], popCols, snppitCols)
+		offOpt, offInvalid = self.formatOptional([names[i] for i in offRows], offCols, snppitCols)
+		tables, unexpected = self.encodeGenotypes(popRows + offRows)
+		self.reportErrors(popInvalid + offInvalid, unexpected)
+
+		popData = dict(zip(popRows, popOpt))
+		offData = dict(zip(offRows, offOpt))
+
+		return self.lines(lineList, mapDict, groups, popData, offData, tables)
+
+	def lines(self, header, mapDict, groups, popData, offData, tables):
+		yield from header
+
+		#need to print all POP before all OFFSPRING
+		yield from self.printData(mapDict, self.POP, "POP", groups, popData, tables)
+		yield from self.printData(mapDict, self.OFFSPRING, "OFFSPRING", groups, offData, tables)
+
+	def reportErrors(self, invalid, unexpected):
+		if invalid:
+			print("CONVERSION NOT SUCCESSFUL")
+			print("Invalid year input detected in the following samples:")
+			for (sampleName, opt, val) in invalid:
+				print(str(sampleName) + "\t" + opt + "\t" + str(val))
+			print("All data in columns containing YEAR should be valid 4-digit years.")
+			print("Leave blank cells if you have unknown or missing data.")
+			print("")
+		if unexpected:
+			print("CONVERSION NOT SUCCESSFUL")
+			print("ERROR in converting alleles. The following alleles were found in your input file:")
+			for allele in sorted(unexpected):
+				print(repr(allele))
+			print("Did you remember to remove sex-linked markers?")
+			print("")
+		if invalid or unexpected:
+			raise SystemExit
 
 	def split(self, word):
 		return [char for char in word]
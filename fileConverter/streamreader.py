@@ -0,0 +1,119 @@
+import numpy
+import pandas
+
+class StreamReader():
+	'Class for reading genotype .csv files in row chunks and dropping individuals that fail missing data filters early'
+
+	def __init__(self, infile, chunksize, pmissInd, removeLoci, removeInds):
+		self.infile = infile
+		self.chunksize = chunksize # number of rows read at a time
+		self.pmissInd = pmissInd # allowable proportion of missing data individual
+		self.removeLoci = self.readList(removeLoci) # blacklisted loci (excluded from individual missing data)
+		self.removeInds = set(self.readList(removeInds)) # blacklisted individuals (never dropped early)
+
+		# summaries of the complete input file, accumulated while streaming
+		self.popCounts = dict() # individuals per population
+		self.pops = dict() # population of every individual
+		self.missLocPCT = pandas.Series(dtype=float) # proportion of missing data per locus column
+		self.missIndPCT = pandas.Series(dtype=float) # proportion of missing data per individual
+		self.dropped = pandas.Series(dtype=float) # missing data proportion of individuals dropped while streaming
+		self.ldict = dict() # locus dictionary (same as LocusDict.getUnique on the complete file)
+		self.freqs = dict() # allele counts per locus (same as LocusDict.getFreqs on the complete file)
+
+	def readList(self, listFile):
+		items = list()
+		if listFile:
+			with open(listFile, 'r') as fh:
+				for line in fh:
+					items.append(line.strip())
+		return items
+
+	def read(self):
+		print(f"Streaming input file in chunks of {self.chunksize} rows.\n")
+		header = pandas.read_csv(self.infile, index_col=0, header=0, nrows=0)
+		alleleCols = [col for col in header.columns if col.endswith(("_1", "_2"))]
+		otherCols = [col for col in header.columns if col not in alleleCols]
+
+		# individual missing data filter ignores blacklisted loci, just like filterInds after removeLoci
+		blacklist = set(self.removeLoci)
+		filterCols = numpy.array([col[:-2] not in blacklist for col in alleleCols])
+
+		tables = [dict() for col in alleleCols] # per column allele -> code, in order of first appearance
+		counts = [numpy.zeros(0, dtype=numpy.int64) for col in alleleCols] # per column allele counts
+		missLoc = numpy.zeros(len(alleleCols), dtype=numpy.int64)
+
+		names = list() # all individuals
+		missAll = list() # missing data proportion of every individual over all loci
+		keepCodes = list() # allele codes of individuals that pass the filter
+		keepNames = list()
+		extras = list() # non-allele columns of all individuals
+		droppedNames = list()
+		droppedPCT = list()
+
+		reader = pandas.read_csv(self.infile, index_col=0, header=0, chunksize=self.chunksize, dtype={col: object for col in alleleCols})
+		for chunk in reader:
+			codes = numpy.full((len(chunk), len(alleleCols)), -1, dtype=numpy.int16)
+			for j, col in enumerate(alleleCols):
+				inverse, uniq = pandas.factorize(chunk[col].to_numpy(dtype=object))
+				table = tables[j]
+				mapped = numpy.array([table.setdefault(allele, len(table)) for allele in uniq] + [-1], dtype=numpy.int16)
+				codes[:, j] = mapped[inverse] # code -1 selects missing data
+				called = codes[:, j][codes[:, j] >= 0]
+				grown = numpy.zeros(len(table), dtype=numpy.int64)
+				grown[:len(counts[j])] = counts[j]
+				counts[j] = grown + numpy.bincount(called, minlength=len(table))
+
+			missing = codes < 0
+			missLoc += missing.sum(axis=0)
+			missAll.append(missing.sum(axis=1) / len(alleleCols))
+			missFilter = missing[:, filterCols].sum(axis=1) / max(int(filterCols.sum()), 1)
+
+			chunkNames = chunk.index.to_list()
+			blacklisted = numpy.array([name in self.removeInds for name in chunkNames], dtype=bool)
+			fail = (missFilter > self.pmissInd) & ~blacklisted # blacklisted individuals are removed later by removeInds
+
+			names.extend(chunkNames)
+			extras.append(chunk[otherCols])
+			keepCodes.append(codes[~fail])
+			keepNames.extend([name for name, f in zip(chunkNames, fail) if not f])
+			droppedNames.extend([name for name, f in zip(chunkNames, fail) if f])
+			droppedPCT.extend(missFilter[fail].tolist())
+
+		nInds = len(names)
+		print(f"Read {nInds} individuals; {len(droppedNames)} were dropped while reading for exceeding the missing data threshold.\n")
+
+		# summaries of the complete file
+		extra = pandas.concat(extras) if extras else header[otherCols]
+		if 'Population ID' in extra.columns:
+			self.popCounts = extra['Population ID'].value_counts().to_dict()
+			self.pops = extra['Population ID'].to_dict()
+		self.missLocPCT = pandas.Series(missLoc / max(nInds, 1), index=alleleCols)
+		self.missIndPCT = pandas.Series(numpy.concatenate(missAll) if missAll else [], index=pandas.Index(names, name=header.index.name), dtype=float)
+		self.dropped = pandas.Series(droppedPCT, index=pandas.Index(droppedNames, name=header.index.name), dtype=float)
+		self.summarize(alleleCols, tables, counts)
+
+		# materialize surviving individuals; allele columns are stored as categorical codes
+		keep = numpy.concatenate(keepCodes) if keepCodes else numpy.empty((0, len(alleleCols)), dtype=numpy.int16)
+		df = extra.loc[keepNames].copy()
+		genotypes = dict()
+		for j, col in enumerate(alleleCols):
+			genotypes[col] = pandas.Categorical.from_codes(keep[:, j], categories=pandas.Index(list(tables[j].keys()), dtype=object))
+		df = pandas.concat([df, pandas.DataFrame(genotypes, index=df.index)], axis=1)[header.columns]
+
+		return df
+
+	def summarize(self, alleleCols, tables, counts):
+		# locus dictionary and allele frequencies in the same order as a scan of the _1 column followed by the _2 column
+		colIdx = {col: j for j, col in enumerate(alleleCols)}
+		for col in alleleCols[1::2]:
+			locus = col[:-2]
+			j1 = colIdx[locus + "_1"]
+			j2 = colIdx[locus + "_2"]
+
+			total = dict() # allele -> count; insertion order = order of first appearance
+			for j in (j1, j2):
+				for allele, code in tables[j].items():
+					total[allele] = total.get(allele, 0) + int(counts[j][code])
+
+			self.ldict[locus] = {allele: str(i + 101) for i, allele in enumerate(total.keys())}
+			self.freqs[locus] = dict(sorted(total.items(), key=lambda item: -item[1])) # sorted() is stable for ties
@@ -0,0 +1,61 @@
+import numpy
+import os
+
+class ThresholdSweep():
+	'Class for counting the individuals and loci that pass the missing data filters over a grid of thresholds'
+
+	def __init__(self, missing, pops, log, outDir):
+		self.missing = missing # Missingness object for the dataset after blacklisted loci/individuals were removed
+		self.pops = pops # dict of population information for all individuals
+		self.log = log
+		self.outDir = outDir
+
+	def run(self, indGrid, locGrid):
+		mask = self.missing.matrix() # individuals x remaining allele columns; True = missing
+		nInds, nCols = mask.shape
+		columns = self.missing.keptColumns()
+		loci, locusIds = numpy.unique([col[:-2] for col in columns], return_inverse=True)
+
+		popNames, popIds = numpy.unique([str(self.pops[name]) for name in self.missing.inds], return_inverse=True)
+		missInd = self.missing.rowMissing / nCols # same proportions as calcMissingIndPCT
+
+		header = ["pmissind", "pmissloc", "Individuals", "Loci", "SplitLoci"] + popNames.tolist()
+		table = ["\t".join(header)]
+		split = list() # threshold pairs at which the locus filter would remove single allele columns
+		with numpy.errstate(divide='ignore', invalid='ignore'):
+			for pmissInd in indGrid:
+				# individual filter runs first, so locus missing data only counts the individuals that pass it
+				keepInds = ~(missInd > pmissInd)
+				popCounts = numpy.bincount(popIds[keepInds], minlength=len(popNames))
+				missLoc = mask[keepInds].sum(axis=0) / int(keepInds.sum())
+				for pmissLoc in locGrid:
+					keepCols = ~(missLoc > pmissLoc)
+					# the locus filter removes allele columns one by one; a locus survives if both of its columns pass,
+					# and a locus with only one passing column leaves an unpaired column that breaks the run
+					passing = numpy.bincount(locusIds, weights=keepCols, minlength=len(loci))
+					nLoci = int((passing == 2).sum())
+					nSplit = int((passing == 1).sum())
+					if nSplit:
+						split.append(f"-i {pmissInd} -l {pmissLoc}")
+					row = [str(pmissInd), str(pmissLoc), str(int(keepInds.sum())), str(nLoci), str(nSplit)] + [str(c) for c in popCounts]
+					table.append("\t".join(row))
+
+		print("\nIndividuals and loci passing missing data filters for each pair of thresholds")
+		print("(blacklists applied; duplicate and monomorphic locus filters not applied):")
+		print("\n".join(table))
+		with open(self.log, 'a') as fh:
+			fh.write("\nIndividuals and loci passing missing data filters for each pair of thresholds:\n")
+			fh.write("\n".join(table))
+			fh.write("\n")
+
+		if split:
+			warning = "WARNING: at " + ", ".join(split) + " only one allele column of some loci (SplitLoci) passes the locus filter. A run with these thresholds would remove single allele columns and leave unpaired locus columns; it exits when their number is odd."
+			print("\n" + warning)
+			with open(self.log, 'a') as fh:
+				fh.write("\n" + warning + "\n")
+
+		outName = os.path.join(self.outDir, "missingDataSweep.tsv")
+		with open(outName, 'w') as fh:
+			fh.write("\n".join(table))
+			fh.write("\n")
+		print("\nWrote threshold sweep table to", outName)
@@ -0,0 +1,42 @@
+class UnionFind():
+	'Class for grouping items into disjoint sets (union-find with path compression)'
+
+	def __init__(self):
+		self.index = dict() # item -> node id
+		self.items = list() # node id -> item
+		self.parent = list()
+		self.size = list()
+
+	def add(self, item):
+		if item not in self.index:
+			self.index[item] = len(self.items)
+			self.items.append(item)
+			self.parent.append(len(self.parent))
+			self.size.append(1)
+		return self.index[item]
+
+	def find(self, node):
+		root = node
+		while self.parent[root] != root:
+			root = self.parent[root]
+		# point every node on the path directly at the root
+		while self.parent[node] != root:
+			self.parent[node], node = root, self.parent[node]
+		return root
+
+	def union(self, a, b):
+		ra = self.find(self.add(a))
+		rb = self.find(self.add(b))
+		if ra != rb:
+			# attach smaller set below larger set
+			if self.size[ra] < self.size[rb]:
+				ra, rb = rb, ra
+			self.parent[rb] = ra
+			self.size[ra] += self.size[rb]
+
+	def groups(self):
+		# list of sets; members listed in the order they were first added
+		groups = dict()
+		for node, item in enumerate(self.items):
+			groups.setdefault(self.find(node), list()).append(item)
+		return list(groups.values())